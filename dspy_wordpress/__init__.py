@@ -1 +1,2 @@
 WEAVIATE_CLASSNAME = 'WordpressLuminis'
+WEAVIATE_DOCUMENT_CLASSNAME = 'WordpressLuminisDocuments'
@@ -0,0 +1,3 @@
+import logging
+
+logger_embedding = logging.getLogger('embeddinglogger')
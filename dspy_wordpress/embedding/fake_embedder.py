@@ -0,0 +1,74 @@
+import hashlib
+import threading
+import time
+from collections import deque
+from typing import List, Optional
+
+import numpy as np
+from rag4p.rag.embedding.embedder import Embedder
+
+
+class FakeRateLimitError(Exception):
+    """Looks like the RateLimitError of the OpenAI client, a status_code of 429 and the seconds to wait."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = 429
+        self.retry_after = retry_after
+
+
+class FakeRateLimitedEmbedder(Embedder):
+    """
+    Embedder that simulates a rate limited provider, without calling one. It accepts at most requests_per_minute
+    requests and tokens_per_minute tokens in a sliding window of one minute, every request above that gets a
+    FakeRateLimitError. With a failure_rate, requests also fail randomly with a 429. Every request takes latency
+    seconds. The embeddings are derived from a hash of the text, so the same text always gets the same embedding.
+    """
+
+    def __init__(self,
+                 requests_per_minute: float = 60,
+                 tokens_per_minute: float = 100_000,
+                 dimension: int = 1536,
+                 latency: float = 0.01,
+                 failure_rate: float = 0.0,
+                 retry_after: Optional[float] = None,
+                 seed: int = 42):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.dimension = dimension
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.retry_after = retry_after
+        self.random = np.random.default_rng(seed)
+        self.requests = deque()
+        self.batch_sizes = []
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    def embed(self, text: str) -> List[float]:
+        return self.embed_batch([text])[0].tolist()
+
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        tokens = sum(max(1, len(text) // 4) for text in texts)
+        with self.lock:
+            now = time.monotonic()
+            while self.requests and self.requests[0][0] < now - 60:
+                self.requests.popleft()
+
+            used_tokens = sum(request_tokens for _, request_tokens in self.requests)
+            if (len(self.requests) >= self.requests_per_minute
+                    or used_tokens + tokens > self.tokens_per_minute
+                    or self.random.random() < self.failure_rate):
+                self.rejected += 1
+                raise FakeRateLimitError("Rate limit reached", retry_after=self.retry_after)
+
+            self.requests.append((now, tokens))
+            self.batch_sizes.append(len(texts))
+
+        time.sleep(self.latency)
+        return np.asarray([self.__embed_text(text) for text in texts], dtype=np.float32)
+
+    def __embed_text(self, text: str) -> np.ndarray:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        embedding = np.random.default_rng(seed).standard_normal(self.dimension)
+        return embedding / np.linalg.norm(embedding)
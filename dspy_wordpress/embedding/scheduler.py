@@ -0,0 +1,366 @@
+import copy
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Deque, List, Optional
+
+import numpy as np
+from rag4p.rag.embedding.embedder import Embedder
+
+from dspy_wordpress.embedding import logger_embedding
+from dspy_wordpress.util.batch_embedding import embed_batch_with_usage
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+
+# Limits of the OpenAI embeddings endpoint for one request
+OPENAI_MAX_BATCH_SIZE = 2048
+OPENAI_MAX_BATCH_TOKENS = 300_000
+
+# Price in dollars per million tokens of text-embedding-3-small
+TEXT_EMBEDDING_3_SMALL_PRICE = 0.02
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough estimate of the number of tokens, about four characters per token for English text."""
+    return max(1, len(text) // 4)
+
+
+# Errors of the OpenAI client without a response, the request may succeed when it is sent again
+TRANSIENT_ERROR_NAMES = {"APIConnectionError", "APITimeoutError"}
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    return getattr(error, "status_code", None) == 429
+
+
+def is_transient_error(error: Exception) -> bool:
+    """Errors worth a retry: rate limits, server errors, timeouts and lost connections."""
+    status_code = getattr(error, "status_code", None)
+    if isinstance(status_code, int):
+        return status_code == 429 or status_code >= 500
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    return any(error_class.__name__ in TRANSIENT_ERROR_NAMES for error_class in type(error).__mro__)
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Reads the time to wait from the error, the OpenAI errors carry the retry-after header of the response."""
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after is None:
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None)
+        retry_after = headers.get("retry-after") if headers is not None else None
+
+    try:
+        return float(retry_after) if retry_after is not None else None
+    except ValueError:
+        return None
+
+
+class TokenBucket:
+    """
+    Allows rate_per_minute units per minute, with bursts up to the capacity. The bucket starts full.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.available = self.capacity
+        self.updated = time.monotonic()
+
+    def __refill(self):
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, reserve: float = 0.0) -> float:
+        """Seconds until amount units are available while keeping reserve units in the bucket."""
+        self.__refill()
+        missing = min(amount + reserve, self.capacity) - self.available
+        return max(0.0, missing / self.rate)
+
+    def consume(self, amount: float):
+        """Takes amount units from the bucket, a negative amount gives units back."""
+        self.__refill()
+        self.available = min(self.capacity, self.available - min(amount, self.capacity))
+
+    def drain(self):
+        """Empties the bucket, used when the provider tells the limit is reached before the bucket does."""
+        self.__refill()
+        self.available = min(self.available, 0.0)
+
+
+class _PendingEmbedding:
+    def __init__(self, text: str, tokens: int, priority: int):
+        self.text = text
+        self.tokens = tokens
+        self.priority = priority
+        self.attempts = 0
+        self.future = Future()
+
+
+class EmbeddingScheduler:
+    """
+    Central point for all calls to a rate limited embedding provider. Ingestion and queries submit their texts to the
+    scheduler instead of calling the embedder directly. The scheduler:
+
+    - keeps the requests and tokens per minute within the limits, using a token bucket for both.
+    - gives interactive queries priority over bulk ingestion. Every lane has its own worker, so an interactive request
+      goes out while a bulk request is in flight. Bulk batches are only sent when no interactive texts are waiting, and
+      they leave interactive_reserve of the buckets free for the queries.
+    - combines the pending texts of one lane into batches up to the maximum size of a provider request.
+    - retries batches that got a 429 response, a server error, a timeout or a lost connection, with exponential backoff
+      or the retry-after of the provider. After a 429 the buckets are emptied, so the scheduler slows down to the
+      configured rate. The OpenAI client of the embedder does not retry itself, the scheduler sees every 429.
+    - counts the tokens and the spend, see stats() and report(). The tokens are the tokens the provider billed, when
+      the embedder does not report them the estimate of the token_counter is used.
+
+    Use embedder(priority) to get an Embedder that can be given to the content stores and the retrievers.
+    """
+
+    def __init__(self,
+                 embedder: Embedder,
+                 requests_per_minute: float = 3000,
+                 tokens_per_minute: float = 1_000_000,
+                 max_batch_size: int = OPENAI_MAX_BATCH_SIZE,
+                 max_batch_tokens: int = OPENAI_MAX_BATCH_TOKENS,
+                 interactive_reserve: float = 0.1,
+                 max_retries: int = 8,
+                 initial_backoff: float = 1.0,
+                 max_backoff: float = 60.0,
+                 price_per_million_tokens: float = TEXT_EMBEDDING_3_SMALL_PRICE,
+                 token_counter: Callable[[str], int] = estimate_tokens):
+        self._embedder = self.__without_client_retries(embedder)
+        self._request_bucket = TokenBucket(requests_per_minute)
+        self._token_bucket = TokenBucket(tokens_per_minute)
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.interactive_reserve = interactive_reserve
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.price_per_million_tokens = price_per_million_tokens
+        self.token_counter = token_counter
+
+        self._lanes: List[Deque[_PendingEmbedding]] = [deque(), deque()]
+        self._condition = threading.Condition()
+        self._paused_until = 0.0
+        self._consecutive_failures = 0
+        self._closed = False
+
+        self._started = time.monotonic()
+        self._requests = 0
+        self._texts = 0
+        self._tokens = 0
+        self._retries = 0
+        self._rate_limited = 0
+        self._transient_errors = 0
+        self._failed = 0
+
+        self._threads = [threading.Thread(target=self.__run, args=(priority,), name=f"embedding-scheduler-{name}",
+                                          daemon=True)
+                         for priority, name in ((PRIORITY_INTERACTIVE, "interactive"), (PRIORITY_BULK, "bulk"))]
+        for thread in self._threads:
+            thread.start()
+
+    @staticmethod
+    def __without_client_retries(embedder: Embedder) -> Embedder:
+        """
+        The OpenAI client retries a 429 up to two times with its own backoff. The scheduler uses a copy of the embedder
+        with a client that does not retry, so the counts, the backoff and the buckets see every request.
+        """
+        client = getattr(embedder, "client", None)
+        if client is None or not hasattr(client, "with_options"):
+            return embedder
+
+        embedder = copy.copy(embedder)
+        embedder.client = client.with_options(max_retries=0)
+        return embedder
+
+    def submit(self, text: str, priority: int = PRIORITY_INTERACTIVE) -> Future:
+        pending = _PendingEmbedding(text=text, tokens=self.token_counter(text), priority=priority)
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("The embedding scheduler is closed.")
+            self._lanes[priority].append(pending)
+            self._condition.notify_all()
+        return pending.future
+
+    def embed(self, text: str, priority: int = PRIORITY_INTERACTIVE) -> List[float]:
+        return self.submit(text, priority).result()
+
+    def embed_many(self, texts: List[str], priority: int = PRIORITY_BULK) -> List[List[float]]:
+        futures = [self.submit(text, priority) for text in texts]
+        return [future.result() for future in futures]
+
+    def embedder(self, priority: int = PRIORITY_INTERACTIVE) -> Embedder:
+        return ScheduledEmbedder(scheduler=self, priority=priority)
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join()
+
+    def stats(self) -> dict:
+        with self._condition:
+            elapsed = time.monotonic() - self._started
+            return {
+                "requests": self._requests,
+                "texts": self._texts,
+                "tokens": self._tokens,
+                "retries": self._retries,
+                "rate_limited": self._rate_limited,
+                "transient_errors": self._transient_errors,
+                "failed": self._failed,
+                "pending_interactive": len(self._lanes[PRIORITY_INTERACTIVE]),
+                "pending_bulk": len(self._lanes[PRIORITY_BULK]),
+                "tokens_per_second": self._tokens / elapsed if elapsed > 0 else 0.0,
+                "spend": self._tokens / 1_000_000 * self.price_per_million_tokens,
+            }
+
+    def report(self):
+        stats = self.stats()
+        logger_embedding.info(f"Embedded {stats['texts']} texts in {stats['requests']} requests, "
+                              f"{stats['tokens']} tokens ({stats['tokens_per_second']:.0f} tokens/sec), "
+                              f"spend ${stats['spend']:.4f}, {stats['rate_limited']} rate limited, "
+                              f"{stats['transient_errors']} transient errors, {stats['retries']} retries, "
+                              f"{stats['failed']} failed")
+        return stats
+
+    def __run(self, priority: int):
+        while True:
+            with self._condition:
+                batch = self.__next_batch(priority)
+                if batch is None:
+                    return
+
+            self.__process(batch)
+
+    def __next_batch(self, priority: int) -> Optional[List[_PendingEmbedding]]:
+        """
+        Waits until a batch of the lane may be sent to the provider, has to be called with the condition acquired. The
+        bulk lane waits as long as interactive texts are pending.
+        """
+        lane = self._lanes[priority]
+        while True:
+            if self._closed and not lane:
+                return None
+
+            if not lane or (priority == PRIORITY_BULK and self._lanes[PRIORITY_INTERACTIVE]):
+                self._condition.wait()
+                continue
+
+            now = time.monotonic()
+            if now < self._paused_until:
+                self._condition.wait(self._paused_until - now)
+                continue
+
+            batch_size = 0
+            batch_tokens = 0
+            for pending in lane:
+                if batch_size > 0 and (batch_size == self.max_batch_size
+                                       or batch_tokens + pending.tokens > self.max_batch_tokens):
+                    break
+                batch_size += 1
+                batch_tokens += pending.tokens
+
+            reserve = self.interactive_reserve if priority == PRIORITY_BULK else 0.0
+            wait = max(self._request_bucket.wait_time(1, reserve * self._request_bucket.capacity),
+                       self._token_bucket.wait_time(batch_tokens, reserve * self._token_bucket.capacity))
+            if wait > 0:
+                # Wakes up early when an interactive text arrives, so it does not wait behind a bulk batch
+                self._condition.wait(wait)
+                continue
+
+            self._request_bucket.consume(1)
+            self._token_bucket.consume(batch_tokens)
+            batch = [lane.popleft() for _ in range(batch_size)]
+            # The bulk worker waits for an empty interactive lane
+            self._condition.notify_all()
+            return batch
+
+    def __process(self, batch: List[_PendingEmbedding]):
+        try:
+            embeddings, billed_tokens = embed_batch_with_usage(self._embedder, [pending.text for pending in batch])
+        except Exception as e:
+            if is_transient_error(e):
+                self.__retry(batch, e)
+            else:
+                logger_embedding.error(f"Embedding a batch of {len(batch)} texts failed: {e}")
+                with self._condition:
+                    self._failed += len(batch)
+                for pending in batch:
+                    pending.future.set_exception(e)
+            return
+
+        estimated_tokens = sum(pending.tokens for pending in batch)
+        with self._condition:
+            self._consecutive_failures = 0
+            self._requests += 1
+            self._texts += len(batch)
+            if billed_tokens is None:
+                self._tokens += estimated_tokens
+            else:
+                self._tokens += billed_tokens
+                # The bucket was charged with the estimate, correct it with what the provider counted
+                self._token_bucket.consume(billed_tokens - estimated_tokens)
+
+        for pending, embedding in zip(batch, embeddings):
+            pending.future.set_result(np.asarray(embedding).tolist())
+
+    def __retry(self, batch: List[_PendingEmbedding], error: Exception):
+        retry = []
+        for pending in batch:
+            pending.attempts += 1
+            if pending.attempts > self.max_retries:
+                pending.future.set_exception(error)
+            else:
+                retry.append(pending)
+
+        rate_limited = is_rate_limit_error(error)
+        with self._condition:
+            if rate_limited:
+                self._rate_limited += 1
+            else:
+                self._transient_errors += 1
+            self._consecutive_failures += 1
+            self._retries += len(retry)
+            self._failed += len(batch) - len(retry)
+
+            backoff = retry_after_seconds(error)
+            if backoff is None:
+                backoff = min(self.max_backoff, self.initial_backoff * 2 ** (self._consecutive_failures - 1))
+                backoff *= 0.5 + random.random() / 2
+            self._paused_until = max(self._paused_until, time.monotonic() + backoff)
+            if rate_limited:
+                # The provider counts differently or is shared with other clients, start again from an empty bucket
+                self._request_bucket.drain()
+                self._token_bucket.drain()
+                logger_embedding.warning(f"Rate limited, retrying {len(retry)} texts in {backoff:.2f} seconds")
+            else:
+                logger_embedding.warning(f"Embedding failed with {type(error).__name__}: {error}, "
+                                         f"retrying {len(retry)} texts in {backoff:.2f} seconds")
+
+            # The texts go back to the front of their lane, so they keep their place in the queue
+            for pending in reversed(retry):
+                self._lanes[pending.priority].appendleft(pending)
+            self._condition.notify_all()
+
+
+class ScheduledEmbedder(Embedder):
+    """Embedder that sends its texts through the EmbeddingScheduler with a fixed priority."""
+
+    def __init__(self, scheduler: EmbeddingScheduler, priority: int = PRIORITY_INTERACTIVE):
+        self.scheduler = scheduler
+        self.priority = priority
+
+    def embed(self, text: str) -> List[float]:
+        return self.scheduler.embed(text, self.priority)
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        return self.scheduler.embed_many(texts, self.priority)
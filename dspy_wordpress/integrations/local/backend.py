@@ -0,0 +1,57 @@
+import os
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+from dspy import Retrieve
+from rag4p.indexing.indexing_service import IndexingService
+from rag4p.indexing.splitters.max_token_splitter import MaxTokenSplitter
+from rag4p.integrations.openai import DEFAULT_EMBEDDING_MODEL
+from rag4p.rag.store.local.internal_content_store import InternalContentStore
+
+from dspy_wordpress.embedding.scheduler import EmbeddingScheduler
+from dspy_wordpress.integrations.local.local_rm import LocalRM
+from dspy_wordpress.integrations.local.shared_local_index import HierarchicalLocalIndex, SharedIndexContentStore
+from dspy_wordpress.util.dimension_reduction import EmbeddingTransform, PcaTransform, reduce_embedder
+from dspy_wordpress.util.embedder_factory import EMBEDDER_ONNX, create_embedder
+from dspy_wordpress.util.wordpress_jsonl_reader import WordpressJsonlReader
+
+
+def create_retriever(openai_api_key: Optional[str] = None,
+                     transform: Optional[EmbeddingTransform] = None,
+                     scheduler: Optional[EmbeddingScheduler] = None,
+                     num_documents: int = 0) -> Retrieve:
+    # The scheduler is not used, the onnx embedder runs locally and has no rate limits
+    if num_documents < 0:
+        raise ValueError(f"The num_documents cannot be negative, got {num_documents}")
+
+    embedder = create_embedder(EMBEDDER_ONNX)
+    splitter = MaxTokenSplitter(max_tokens=200, model=DEFAULT_EMBEDDING_MODEL)
+    directory = os.getcwd()
+    file_path = Path(os.path.join(directory, "../data", 'two_documents.jsonl'))
+    content_reader = WordpressJsonlReader(file=file_path)
+
+    if num_documents > 0:
+        # The hierarchical search needs the document vectors that the SharedIndexContentStore writes. The store fits
+        # and saves the transform itself, the index applies it to the queries.
+        index_directory = tempfile.mkdtemp(prefix="dspy_wordpress_local_index_")
+        content_store = SharedIndexContentStore(directory=index_directory,
+                                                embedder=embedder,
+                                                embedder_name=EMBEDDER_ONNX,
+                                                transform=transform)
+        IndexingService(content_store=content_store).index_documents(content_reader=content_reader,
+                                                                     splitter=splitter)
+        content_store.save()
+        index = HierarchicalLocalIndex(directory=index_directory, embedder=embedder, num_documents=num_documents)
+        return LocalRM(content_store=index, k=2)
+
+    # The InternalContentStore embeds every chunk when it is stored, there is no moment to fit a PCA transform first
+    if isinstance(transform, PcaTransform) and not transform.is_fitted():
+        raise ValueError("The local backend needs a fitted PCA transform, load one with load_transform or use "
+                         "num_documents, the SharedIndexContentStore fits the transform itself.")
+
+    content_store = InternalContentStore(embedder=reduce_embedder(embedder, transform))
+    indexing_service = IndexingService(content_store=content_store)
+    indexing_service.index_documents(content_reader=content_reader, splitter=splitter)
+
+    return LocalRM(content_store=content_store, k=2)
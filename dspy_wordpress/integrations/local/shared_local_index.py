@@ -0,0 +1,273 @@
+import json
+from pathlib import Path
+from typing import List, Optional, Union
+
+import numpy as np
+from rag4p.rag.embedding.embedder import Embedder
+from rag4p.rag.model.chunk import Chunk
+from rag4p.rag.store.content_store import ContentStore
+
+from dspy_wordpress.util.batch_embedding import embed_batch
+from dspy_wordpress.util.dimension_reduction import EmbeddingTransform, PcaTransform, ReducedEmbedder, \
+    load_transform
+
+INDEX_FILE = "index.json"
+CHUNKS_FILE = "chunks.jsonl"
+EMBEDDINGS_FILE = "embeddings.npy"
+SQUARED_NORMS_FILE = "squared_norms.npy"
+DOCUMENTS_FILE = "documents.npy"
+DOCUMENT_SQUARED_NORMS_FILE = "document_squared_norms.npy"
+DOCUMENT_RANGES_FILE = "document_ranges.npy"
+TRANSFORM_FILE = "transform.npz"
+
+DOCUMENT_VECTORS_MEAN = "mean"
+DOCUMENT_VECTORS_TITLE = "title"
+
+
+def read_index_metadata(directory: Union[str, Path]) -> dict:
+    with open(Path(directory) / INDEX_FILE, 'r') as file:
+        return json.load(file)
+
+
+class SharedIndexContentStore(ContentStore):
+    """
+    Content store that writes the chunks and their embeddings to a directory. The embeddings end up in one float32
+    matrix on disk, the SharedLocalIndex memory-maps that file. That way all worker processes share the same pages
+    instead of every process holding its own copy of the index.
+
+    Next to the chunks, the store writes one summary vector per document. With document_vectors "mean" this is the
+    mean of the chunk embeddings, with "title" it is the embedding of the title followed by the first chunk. The
+    HierarchicalLocalIndex uses these vectors to shortlist documents before scoring chunks.
+
+    With a transform, the full width embeddings are reduced when the index is saved. A PcaTransform that is not fitted
+    yet is fitted on all chunk embeddings first. The transform is saved with the index, the SharedLocalIndex applies
+    it to the queries.
+    """
+
+    def __init__(self, directory: Union[str, Path], embedder: Embedder, embedder_name: str,
+                 document_vectors: str = DOCUMENT_VECTORS_MEAN, transform: Optional[EmbeddingTransform] = None):
+        if document_vectors not in (DOCUMENT_VECTORS_MEAN, DOCUMENT_VECTORS_TITLE):
+            raise ValueError(f"Unknown document vectors: {document_vectors}")
+
+        self.directory = Path(directory)
+        self.embedder = embedder
+        self.embedder_name = embedder_name
+        self.document_vectors = document_vectors
+        self.transform = transform
+        self._chunks = []
+        self._embeddings = []
+        self._documents = []
+        self._document_ranges = []
+
+    def store(self, chunks: List[Chunk]):
+        if not chunks:
+            return
+
+        # The indexing service stores all chunks of one document in a single call, so they are stored next to
+        # each other and the document can be described by a range of chunk rows.
+        start = len(self._chunks)
+        self._embeddings.extend(embed_batch(self.embedder, [chunk.chunk_text for chunk in chunks]))
+        for chunk in chunks:
+            self._chunks.append({
+                "document_id": chunk.document_id,
+                "chunk_id": chunk.chunk_id,
+                "text": chunk.chunk_text,
+                "total_chunks": len(chunks),
+                "properties": chunk.properties,
+            })
+
+        if self.document_vectors == DOCUMENT_VECTORS_MEAN:
+            self._documents.append(np.mean(np.asarray(self._embeddings[start:], dtype=np.float32), axis=0))
+        else:
+            title = chunks[0].properties.get("title", "")
+            self._documents.append(self.embedder.embed(f"{title}\n{chunks[0].chunk_text}"))
+        self._document_ranges.append((start, len(self._chunks)))
+
+        print(f"Collected {len(chunks)} chunks, {len(self._chunks)} chunks in total.")
+
+    def save(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        embeddings = np.asarray(self._embeddings, dtype=np.float32)
+        documents = np.asarray(self._documents, dtype=np.float32)
+        full_dimension = int(embeddings.shape[1])
+        if self.transform is not None:
+            if isinstance(self.transform, PcaTransform) and not self.transform.is_fitted():
+                self.transform.fit(embeddings)
+            embeddings = self.transform.apply(embeddings)
+            documents = self.transform.apply(documents)
+            self.transform.save(self.directory / TRANSFORM_FILE)
+        else:
+            (self.directory / TRANSFORM_FILE).unlink(missing_ok=True)
+
+        np.save(self.directory / EMBEDDINGS_FILE, embeddings)
+        np.save(self.directory / SQUARED_NORMS_FILE, np.einsum('ij,ij->i', embeddings, embeddings))
+        np.save(self.directory / DOCUMENTS_FILE, documents)
+        np.save(self.directory / DOCUMENT_SQUARED_NORMS_FILE, np.einsum('ij,ij->i', documents, documents))
+        np.save(self.directory / DOCUMENT_RANGES_FILE, np.asarray(self._document_ranges, dtype=np.int64))
+
+        with open(self.directory / CHUNKS_FILE, 'w') as file:
+            for chunk in self._chunks:
+                file.write(json.dumps(chunk) + "\n")
+
+        with open(self.directory / INDEX_FILE, 'w') as file:
+            json.dump({
+                "embedder": self.embedder_name,
+                "dimension": int(embeddings.shape[1]),
+                "full_dimension": full_dimension,
+                "num_chunks": int(embeddings.shape[0]),
+                "num_documents": int(documents.shape[0]),
+                "document_vectors": self.document_vectors,
+            }, file)
+
+        print(f"Saved index with {len(self._chunks)} chunks to {self.directory}")
+
+
+class SharedLocalIndex:
+    """
+    Read only index over the files written by the SharedIndexContentStore. The embeddings are memory-mapped, so opening
+    the index in multiple processes does not copy the matrix. The ranking is the same as the InternalContentStore from
+    rag4p, the smallest euclidean distance first. The index can be used as the content store of the LocalRM.
+
+    When the index was saved with a transform, the provided full width embedder is wrapped in a ReducedEmbedder, so the
+    queries are reduced the same way as the chunks.
+    """
+
+    def __init__(self, directory: Union[str, Path], embedder: Embedder):
+        self.directory = Path(directory)
+        if (self.directory / TRANSFORM_FILE).exists():
+            embedder = ReducedEmbedder(embedder=embedder, transform=load_transform(self.directory / TRANSFORM_FILE))
+        self.embedder = embedder
+        self.metadata = read_index_metadata(self.directory)
+        self.embeddings = np.load(self.directory / EMBEDDINGS_FILE, mmap_mode='r')
+        self.squared_norms = np.load(self.directory / SQUARED_NORMS_FILE, mmap_mode='r')
+
+        with open(self.directory / CHUNKS_FILE, 'r') as file:
+            self.chunks = [self.__to_chunk(json.loads(line)) for line in file]
+
+    @staticmethod
+    def __to_chunk(data: dict) -> Chunk:
+        return Chunk(document_id=data["document_id"],
+                     chunk_id=data["chunk_id"],
+                     total_chunks=data["total_chunks"],
+                     chunk_text=data["text"],
+                     properties=data["properties"])
+
+    def warm_up(self):
+        """
+        Embeds a query and reads the complete matrix once. The first call loads the embedding model, the scan pulls the
+        memory-mapped pages into the page cache that all workers share.
+        """
+        self.find_relevant_chunks("warm up", max_results=1)
+        return float(np.sum(self.embeddings))
+
+    def find_relevant_chunks(self, query: str, max_results: int = 4) -> List[Chunk]:
+        return self.find_relevant_chunks_batch([query], max_results)[0]
+
+    def find_relevant_chunks_batch(self, queries: List[str], max_results: int = 4) -> List[List[Chunk]]:
+        """
+        Embeds all queries in one call to the embedder and scores them against the index in one matrix product.
+        """
+        return self.search(embed_batch(self.embedder, queries), max_results)
+
+    def search(self, query_embeddings: np.ndarray, max_results: int = 4) -> List[List[Chunk]]:
+        k = min(max_results, len(self.chunks))
+        if k <= 0:
+            return [[] for _ in range(len(query_embeddings))]
+
+        # The squared norm of the query is the same for every chunk, so it does not change the ranking.
+        distances = self.squared_norms - 2.0 * (np.asarray(query_embeddings, dtype=np.float32) @ self.embeddings.T)
+        top_k = np.argpartition(distances, k - 1, axis=1)[:, :k]
+
+        results = []
+        for row, candidates in enumerate(top_k):
+            ordered = candidates[np.argsort(distances[row, candidates])]
+            results.append([self.chunks[index] for index in ordered])
+        return results
+
+
+class HierarchicalLocalIndex(SharedLocalIndex):
+    """
+    Two stage variant of the SharedLocalIndex. The first stage scores the summary vectors of the documents and keeps
+    the num_documents closest documents. The second stage only scores the chunks of those documents. The work per
+    query grows with the number of documents instead of the number of chunks.
+
+    With a window_size larger than 0, the text of every hit is extended with the neighbouring chunks of the same
+    document, like the WindowRetrievalStrategy of rag4p does. Hits with overlapping windows become one passage.
+    """
+
+    def __init__(self, directory: Union[str, Path], embedder: Embedder, num_documents: int = 5,
+                 window_size: int = 0):
+        if num_documents < 1:
+            raise ValueError(f"The num_documents has to be at least 1, got {num_documents}")
+        if window_size < 0:
+            raise ValueError(f"The window_size cannot be negative, got {window_size}")
+
+        super().__init__(directory=directory, embedder=embedder)
+        if not (self.directory / DOCUMENTS_FILE).exists():
+            raise ValueError(f"The index in {self.directory} has no document vectors, rebuild the index.")
+
+        self.num_documents = num_documents
+        self.window_size = window_size
+        self.documents = np.load(self.directory / DOCUMENTS_FILE, mmap_mode='r')
+        self.document_squared_norms = np.load(self.directory / DOCUMENT_SQUARED_NORMS_FILE, mmap_mode='r')
+        self.document_ranges = np.load(self.directory / DOCUMENT_RANGES_FILE)
+        self.document_of_chunk = np.repeat(np.arange(len(self.document_ranges)),
+                                           self.document_ranges[:, 1] - self.document_ranges[:, 0])
+
+    def warm_up(self):
+        super().warm_up()
+        return float(np.sum(self.documents))
+
+    def search(self, query_embeddings: np.ndarray, max_results: int = 4) -> List[List[Chunk]]:
+        query_embeddings = np.asarray(query_embeddings, dtype=np.float32)
+        num_documents = min(self.num_documents, len(self.document_ranges))
+        if num_documents == 0 or max_results <= 0:
+            return [[] for _ in range(len(query_embeddings))]
+
+        document_distances = self.document_squared_norms - 2.0 * (query_embeddings @ self.documents.T)
+        shortlists = np.argpartition(document_distances, num_documents - 1, axis=1)[:, :num_documents]
+
+        results = []
+        for query_embedding, shortlist in zip(query_embeddings, shortlists):
+            candidates = np.concatenate([np.arange(*self.document_ranges[document]) for document in shortlist])
+            distances = self.squared_norms[candidates] - 2.0 * (self.embeddings[candidates] @ query_embedding)
+            k = min(max_results, len(candidates))
+            top_k = np.argpartition(distances, k - 1)[:k]
+            ordered = candidates[top_k[np.argsort(distances[top_k])]]
+            results.append(self.__with_windows(ordered))
+        return results
+
+    def __with_windows(self, ordered: np.ndarray) -> List[Chunk]:
+        """
+        Extends the hits with their neighbouring chunks. When the windows of hits overlap, they are merged into one
+        passage in the place of the best hit, so the same text is not returned twice.
+        """
+        if self.window_size <= 0:
+            return [self.chunks[index] for index in ordered]
+
+        # Every window is [best hit, first row, end row], the windows never cross the border of a document
+        windows = []
+        for index in ordered:
+            document_start, document_end = self.document_ranges[self.document_of_chunk[index]]
+            start = max(document_start, index - self.window_size)
+            end = min(document_end, index + self.window_size + 1)
+            overlapping = [window for window in windows if window[1] < end and start < window[2]]
+            if not overlapping:
+                windows.append([index, start, end])
+                continue
+
+            merged = overlapping[0]
+            merged[1] = min([start] + [window[1] for window in overlapping])
+            merged[2] = max([end] + [window[2] for window in overlapping])
+            windows = [window for window in windows if not any(window is other for other in overlapping[1:])]
+
+        return [self.__window_chunk(index, start, end) for index, start, end in windows]
+
+    def __window_chunk(self, index: int, start: int, end: int) -> Chunk:
+        chunk = self.chunks[index]
+        return Chunk(document_id=chunk.document_id,
+                     chunk_id=chunk.chunk_id,
+                     total_chunks=chunk.total_chunks,
+                     chunk_text=" ".join(self.chunks[neighbour].chunk_text for neighbour in range(start, end)),
+                     properties=chunk.properties)
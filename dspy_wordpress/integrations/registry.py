@@ -0,0 +1,50 @@
+import importlib
+from importlib.metadata import entry_points
+from typing import Any, Callable, Dict, List, Union
+
+ENTRY_POINT_GROUP = "dspy_wordpress.backends"
+
+# The built-in backends are registered by the path of their factory, the module is only imported when the backend is
+# selected. That way selecting "local" never imports the Weaviate or Rockset SDK.
+_backends: Dict[str, Union[str, Callable[..., Any]]] = {
+    "local": "dspy_wordpress.integrations.local.backend:create_retriever",
+    "rockset": "dspy_wordpress.integrations.rockset.backend:create_retriever",
+    "weaviate": "dspy_wordpress.integrations.weaviate.backend:create_retriever",
+}
+
+
+def register_backend(name: str, factory: Union[str, Callable[..., Any]]):
+    """
+    Registers a retriever backend. The factory is a callable, or a "module:function" path that is imported the first
+    time the backend is used. Other packages can also provide a backend with an entry point in the
+    "dspy_wordpress.backends" group.
+    """
+    _backends[name] = factory
+
+
+def available_backends() -> List[str]:
+    return sorted(set(_backends) | {entry_point.name for entry_point in entry_points(group=ENTRY_POINT_GROUP)})
+
+
+def load_backend(name: str) -> Callable[..., Any]:
+    factory = _backends.get(name)
+    if factory is None:
+        for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+            if entry_point.name == name:
+                factory = entry_point.load()
+                break
+
+    if factory is None:
+        raise ValueError(f"Unknown retriever: {name}")
+
+    if isinstance(factory, str):
+        module_name, function_name = factory.split(":")
+        factory = getattr(importlib.import_module(module_name), function_name)
+
+    _backends[name] = factory
+    return factory
+
+
+def create_retriever(name: str, **kwargs):
+    """Imports the backend with the provided name and creates its retriever, the kwargs go to the factory."""
+    return load_backend(name)(**kwargs)
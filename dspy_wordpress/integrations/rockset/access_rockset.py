@@ -8,6 +8,7 @@ from rockset.model.query_lambda_sql import QueryLambdaSql
 from rockset.model.query_parameter import QueryParameter
 
 from dspy_wordpress.integrations.rockset import logger_rockset
+from dspy_wordpress.integrations.rockset.wordpress_collection import DEFAULT_DIMENSION
 
 
 class AccessRockset:
@@ -64,7 +65,8 @@ class AccessRockset:
 
         logger_rockset.info(f"The `{name}` collection is still not ready. Check collection status in console.")
 
-    def create_similarity_index(self, workspace: str, collection: str, index_name: str, embedding_field: str):
+    def create_similarity_index(self, workspace: str, collection: str, index_name: str, embedding_field: str,
+                                dimension: int = DEFAULT_DIMENSION):
         logger_rockset.info(f"Creating `{index_name}` index for the `{collection}` collection...")
 
         # This is a DDL Command that will build a new index (similarity index) that we need for vector search
@@ -73,7 +75,7 @@ class AccessRockset:
         CREATE
             SIMILARITY INDEX {workspace}.{index_name}
         ON
-            FIELD {workspace}.{collection}:{embedding_field} DIMENSION 1536 AS 'faiss::IVF10,Flat';
+            FIELD {workspace}.{collection}:{embedding_field} DIMENSION {dimension} AS 'faiss::IVF10,Flat';
         """
         try:
             res = self.client.sql(query=query)
@@ -154,6 +156,53 @@ class AccessRockset:
         except ApiException as e:
             logger_rockset.error(f"Exception when creating query lambda: %s\n" % json.loads(e.body))
 
+    def create_hierarchical_query_lambda(self, workspace: str, collection: str, document_collection: str,
+                                         query_lambda_name: str):
+        description = ("Hierarchical vector search. Shortlists the documents_limit most similar posts using the "
+                       "document embeddings, next it only scores the chunks of those posts.")
+        query = f"""
+        WITH top_documents AS (
+            SELECT
+                document_id
+            FROM
+                {workspace}.{document_collection} HINT(access_path=index_similarity_search)
+            ORDER BY
+                APPROX_DOT_PRODUCT(JSON_PARSE(:search_query_embedding), document_embedding) DESC
+            LIMIT
+                :documents_limit
+        )
+        SELECT
+            title,
+            DOT_PRODUCT(
+                JSON_PARSE(:search_query_embedding),
+                chunk_embedding
+            ) as similarity,
+            document_id,
+            chunk_id,
+            text
+        FROM
+            {workspace}.{collection}
+        WHERE
+            document_id IN (SELECT document_id FROM top_documents)
+        ORDER BY
+            similarity DESC
+        LIMIT
+            :results_limit
+        """
+
+        try:
+            logger_rockset.info(f"Creating hierarchical query lambda `{query_lambda_name}`...")
+            api_response = self.client.QueryLambdas.create_query_lambda(
+                name=query_lambda_name,
+                workspace=workspace,
+                sql=QueryLambdaSql(
+                    query=query,
+                ),
+            )
+            logger_rockset.info(f"Query lambda `{query_lambda_name}` created!\n")
+        except ApiException as e:
+            logger_rockset.error(f"Exception when creating query lambda: %s\n" % json.loads(e.body))
+
     def query_lambda(self, workspace: str, query_lambda_name: str, embedding: list[float], results_limit: int = 3):
         try:
             logger_rockset.info(f"Executing semantic search query from search query embedding...")
@@ -0,0 +1,60 @@
+import os
+from pathlib import Path
+from typing import Optional
+
+from dspy import Retrieve
+from rag4p.indexing.indexing_service import IndexingService
+from rag4p.indexing.splitters.max_token_splitter import MaxTokenSplitter
+from rag4p.integrations.openai import DEFAULT_EMBEDDING_MODEL
+from rag4p.integrations.openai.openai_embedder import OpenAIEmbedder
+from rockset import Regions, RocksetClient
+
+from dspy_wordpress.embedding.scheduler import PRIORITY_BULK, PRIORITY_INTERACTIVE, EmbeddingScheduler
+from dspy_wordpress.integrations.rockset.access_rockset import AccessRockset
+from dspy_wordpress.integrations.rockset.rockset_content_store import RocksetContentStore
+from dspy_wordpress.integrations.rockset.rockset_rm import RocksetRM
+from dspy_wordpress.util.dimension_reduction import EmbeddingTransform, reduce_embedder
+from dspy_wordpress.util.wordpress_jsonl_reader import WordpressJsonlReader
+
+
+def create_retriever(openai_api_key: Optional[str] = None,
+                     transform: Optional[EmbeddingTransform] = None,
+                     scheduler: Optional[EmbeddingScheduler] = None,
+                     num_documents: int = 0) -> Retrieve:
+    rockset_api_key = os.environ.get("ROCKSET_API_KEY")
+    rockset_region = Regions.euc1a1
+    workspace_name = "text_search"
+    # With num_documents the query lambda first shortlists that number of posts, then scores their chunks
+    query_lambda_name = "wordpress_search_hierarchical" if num_documents > 0 else "wordpress_search_small"
+
+    rockset = RocksetClient(host=rockset_region, api_key=rockset_api_key)
+    if scheduler is not None:
+        embedder = scheduler.embedder(PRIORITY_INTERACTIVE)
+    else:
+        embedder = OpenAIEmbedder(api_key=openai_api_key)
+
+    return RocksetRM(rockset_workspace_name=workspace_name,
+                     rockset_client=rockset,
+                     query_lambda_name=query_lambda_name,
+                     embedder=reduce_embedder(embedder, transform),
+                     k=2,
+                     rockset_collection_text_key="text",
+                     documents_limit=num_documents if num_documents > 0 else None)
+
+
+def reindex(scheduler: EmbeddingScheduler, transform: Optional[EmbeddingTransform] = None):
+    """
+    Stores all posts again in the collections created by run_wordpress_import_rockset.py, the chunks replace the stored
+    chunks with the same id. The chunks are embedded with the bulk priority of the scheduler. Give the same scheduler
+    to create_retriever, the queries then go before the chunks and both stay within the rate limits of the account.
+    """
+    rockset = AccessRockset(api_key=os.environ.get("ROCKSET_API_KEY"), api_server_region=Regions.euc1a1)
+    content_store = RocksetContentStore(rockset_access=rockset,
+                                        collection_name="WordPress",
+                                        workspace_name="text_search",
+                                        embedder=reduce_embedder(scheduler.embedder(PRIORITY_BULK), transform),
+                                        document_collection_name="WordPressDocuments")
+    indexing_service = IndexingService(content_store=content_store)
+    splitter = MaxTokenSplitter(max_tokens=200, model=DEFAULT_EMBEDDING_MODEL)
+    file_path = Path(os.path.join(os.getcwd(), "../data", 'all_documents.jsonl'))
+    indexing_service.index_documents(content_reader=WordpressJsonlReader(file=file_path), splitter=splitter)
@@ -1,24 +1,39 @@
-from typing import List
+from typing import List, Optional
 
+import numpy as np
 from rag4p.rag.embedding.embedder import Embedder
 from rag4p.rag.model.chunk import Chunk
 from rag4p.rag.store.content_store import ContentStore
 
 from dspy_wordpress.integrations.rockset.access_rockset import AccessRockset
+from dspy_wordpress.util.batch_embedding import embed_batch
 
 
 class RocksetContentStore(ContentStore):
 
-    def __init__(self, rockset_access: AccessRockset, collection_name: str, workspace_name: str, embedder: Embedder):
+    def __init__(self, rockset_access: AccessRockset, collection_name: str, workspace_name: str, embedder: Embedder,
+                 document_collection_name: Optional[str] = None):
+        """
+        When a document_collection_name is provided, the store also adds one document per post to that collection. The
+        embedding of that document is the mean of the chunk embeddings, it is used by the hierarchical query lambda to
+        shortlist posts before scoring chunks.
+        """
         self.rockset_access = rockset_access
         self.collection_name = collection_name
         self.workspace_name = workspace_name
         self.embedder = embedder
+        self.document_collection_name = document_collection_name
 
     def store(self, chunks: List[Chunk]):
+        if not chunks:
+            return
+
         results = []
-        for chunk in chunks:
+        embeddings = embed_batch(self.embedder, [chunk.chunk_text for chunk in chunks]).tolist()
+        for chunk, embedding in zip(chunks, embeddings):
+            # A fixed _id makes storing a post again replace the chunks instead of adding them twice
             properties = {
+                "_id": chunk.get_id(),
                 "document_id": chunk.document_id,
                 "chunk_id": chunk.chunk_id,
                 "text": chunk.chunk_text,
@@ -28,7 +43,7 @@ class RocksetContentStore(ContentStore):
             for key, value in chunk.properties.items():
                 properties[key] = value
 
-            properties["embedding"] = self.embedder.embed(chunk.chunk_text)
+            properties["embedding"] = embedding
 
             response = self.rockset_access.add_document(
                 workspace=self.workspace_name,
@@ -37,4 +52,22 @@ class RocksetContentStore(ContentStore):
             )
             results.append(response)
 
+        if self.document_collection_name:
+            self.__store_document(chunks[0], embeddings)
+
         print(f"Stored {len(chunks)} chunks in Rockset with {len([r for r in results if r])} successful responses.")
+
+    def __store_document(self, first_chunk: Chunk, embeddings: List[List[float]]):
+        document = {
+            "_id": first_chunk.document_id,
+            "document_id": first_chunk.document_id,
+            "total_chunks": len(embeddings),
+            "title": first_chunk.properties.get("title"),
+            "url": first_chunk.properties.get("url"),
+            "embedding": np.mean(np.asarray(embeddings, dtype=np.float32), axis=0).tolist(),
+        }
+        self.rockset_access.add_document(
+            workspace=self.workspace_name,
+            collection=self.document_collection_name,
+            document=document,
+        )
@@ -17,12 +17,14 @@ class RocksetRM(dspy.Retrieve):
                  embedder: Embedder,
                  k: int = 3,
                  rockset_collection_text_key: Optional[str] = "content",
+                 documents_limit: Optional[int] = None,
                  ):
         self._rockset_workspace_name = rockset_workspace_name
         self._rockset_client = rockset_client
         self._query_lambda_name = query_lambda_name
         self._embedder = embedder
         self._rockset_collection_text_key = rockset_collection_text_key
+        self._documents_limit = documents_limit
         super().__init__(k=k)
 
     def forward(self, query_or_queries: Union[str, List[str]], k: Optional[int] = None) -> Prediction:
@@ -46,22 +48,30 @@ class RocksetRM(dspy.Retrieve):
         for query in queries:
             embedding = self._embedder.embed(query)
             embedding_string = "[" + ",".join([str(num) for num in embedding]) + "]"
+            parameters = [
+                QueryParameter(
+                    name="search_query_embedding",
+                    type="string",
+                    value=embedding_string,
+                ),
+                QueryParameter(
+                    name="results_limit",
+                    type="int",
+                    value=str(k),
+                ),
+            ]
+            if self._documents_limit is not None:
+                # Only used by the hierarchical query lambda, that shortlists posts before scoring chunks
+                parameters.append(QueryParameter(
+                    name="documents_limit",
+                    type="int",
+                    value=str(self._documents_limit),
+                ))
             api_response = self._rockset_client.QueryLambdas.execute_query_lambda_by_tag(
                 query_lambda=self._query_lambda_name,
                 workspace=self._rockset_workspace_name,
                 tag="latest",
-                parameters=[
-                    QueryParameter(
-                        name="search_query_embedding",
-                        type="string",
-                        value=embedding_string,
-                    ),
-                    QueryParameter(
-                        name="results_limit",
-                        type="int",
-                        value=str(k),
-                    ),
-                ]
+                parameters=parameters
             )
             for result in api_response['results']:
                 passages.append(dotdict({"long_text": result[self._rockset_collection_text_key]}))
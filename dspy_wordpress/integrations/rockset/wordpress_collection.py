@@ -1,6 +1,11 @@
-ingest_transformation_query = """
+DEFAULT_DIMENSION = 1536
+
+
+def create_ingest_transformation_query(dimension: int = DEFAULT_DIMENSION) -> str:
+    return f"""
 SELECT
-    VECTOR_ENFORCE(embedding, 1536, 'float') as chunk_embedding,
+    _id,
+    VECTOR_ENFORCE(embedding, {dimension}, 'float') as chunk_embedding,
     document_id,
     chunk_id,
     text,
@@ -15,3 +20,23 @@ FROM
 WHERE
     title IS NOT NULL
 """
+
+
+def create_ingest_document_transformation_query(dimension: int = DEFAULT_DIMENSION) -> str:
+    return f"""
+SELECT
+    _id,
+    VECTOR_ENFORCE(embedding, {dimension}, 'float') as document_embedding,
+    document_id,
+    total_chunks,
+    title,
+    url
+FROM
+    _input
+WHERE
+    title IS NOT NULL
+"""
+
+
+ingest_transformation_query = create_ingest_transformation_query()
+ingest_document_transformation_query = create_ingest_document_transformation_query()
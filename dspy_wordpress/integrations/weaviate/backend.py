@@ -0,0 +1,42 @@
+import os
+from typing import Optional
+
+import weaviate
+from dspy import Retrieve
+
+from dspy_wordpress import WEAVIATE_CLASSNAME, WEAVIATE_DOCUMENT_CLASSNAME
+from dspy_wordpress.embedding.scheduler import PRIORITY_INTERACTIVE, EmbeddingScheduler
+from dspy_wordpress.integrations.weaviate.weaviate_v4_rm import WeaviateV4RM
+from dspy_wordpress.util.dimension_reduction import EmbeddingTransform, reduce_embedder
+
+
+def create_retriever(openai_api_key: Optional[str] = None,
+                     transform: Optional[EmbeddingTransform] = None,
+                     scheduler: Optional[EmbeddingScheduler] = None,
+                     num_documents: int = 0) -> Retrieve:
+    weaviate_api_key = os.environ.get('WEAVIATE_API_KEY')
+    weaviate_url = os.environ.get('WEAVIATE_URL')
+
+    client = weaviate.connect_to_wcs(
+        cluster_url=weaviate_url,
+        auth_credentials=weaviate.auth.AuthApiKey(weaviate_api_key),
+        headers={"X-OpenAI-Api-Key": openai_api_key}
+    )
+
+    # Without a transform or a scheduler Weaviate embeds the query with the vectorizer of the collection
+    query_embedder = None
+    if scheduler is not None:
+        query_embedder = reduce_embedder(scheduler.embedder(PRIORITY_INTERACTIVE), transform)
+    elif transform is not None:
+        from rag4p.integrations.openai.openai_embedder import OpenAIEmbedder
+
+        query_embedder = reduce_embedder(OpenAIEmbedder(api_key=openai_api_key), transform)
+
+    return WeaviateV4RM(weaviate_collection_name=WEAVIATE_CLASSNAME,
+                        weaviate_client=client,
+                        weaviate_collection_text_key="text",
+                        embedder=query_embedder,
+                        k=2,
+                        # With num_documents the search first shortlists that number of posts, then their chunks
+                        weaviate_document_collection_name=WEAVIATE_DOCUMENT_CLASSNAME if num_documents > 0 else None,
+                        weaviate_num_documents=num_documents)
@@ -0,0 +1,55 @@
+from typing import List
+
+import numpy as np
+from rag4p.integrations.weaviate.access_weaviate import AccessWeaviate
+from rag4p.integrations.weaviate.weaviate_content_store import WeaviateContentStore
+from rag4p.rag.embedding.embedder import Embedder
+from rag4p.rag.model.chunk import Chunk
+
+from dspy_wordpress.util.batch_embedding import embed_batch
+
+
+class WeaviateDocumentContentStore(WeaviateContentStore):
+    """
+    Stores the chunks like the WeaviateContentStore, and adds one object per document to the document collection. The
+    vector of that object is the mean of the chunk vectors. The WeaviateV4RM uses the document collection to shortlist
+    documents before searching the chunks.
+    """
+
+    def __init__(self, weaviate_access: AccessWeaviate, embedder: Embedder, collection_name: str,
+                 document_collection_name: str):
+        super().__init__(weaviate_access=weaviate_access, embedder=embedder, collection_name=collection_name)
+        self.document_collection_name = document_collection_name
+
+    def store(self, chunks: List[Chunk]):
+        if not chunks:
+            return
+
+        vectors = embed_batch(self.embedder, [chunk.chunk_text for chunk in chunks])
+        for chunk, vector in zip(chunks, vectors):
+            properties = {
+                "documentId": chunk.document_id,
+                "chunkId": chunk.chunk_id,
+                "text": chunk.chunk_text,
+                "totalChunks": len(chunks),
+            }
+
+            for key, value in chunk.properties.items():
+                properties[key] = value
+
+            self.weaviate_access.add_document(
+                collection_name=self.collection_name,
+                properties=properties,
+                vector=vector.tolist()
+            )
+
+        self.weaviate_access.add_document(
+            collection_name=self.document_collection_name,
+            properties={
+                "documentId": chunks[0].document_id,
+                "totalChunks": len(chunks),
+                "title": chunks[0].properties.get("title"),
+                "url": chunks[0].properties.get("url"),
+            },
+            vector=np.mean(vectors, axis=0).tolist()
+        )
@@ -2,15 +2,15 @@ from typing import List, Optional, Union
 
 import dspy
 from dsp.utils import dotdict
+from rag4p.rag.embedding.embedder import Embedder
 
 try:
     import weaviate
     from weaviate.collections.classes.grpc import HybridFusion
     import weaviate.classes as wvc
 except ImportError:
-    raise ImportError(
-        "The 'weaviate' extra is required to use WeaviateRM. Install it with `pip install dspy-ai[weaviate]`",
-    )
+    # Importing this module should not fail without weaviate, only using the retriever does
+    weaviate = None
 
 
 class WeaviateV4RM(dspy.Retrieve):
@@ -27,6 +27,11 @@ class WeaviateV4RM(dspy.Retrieve):
         weaviate_collection_text_key (str, optional): The key in the collection with the content. Defaults to content.
         weaviate_alpha (float, optional): The alpha value for the hybrid query. Defaults to 0.5.
         weaviate_fusion_type (wvc.HybridFusion, optional): The fusion type for the query. Defaults to RELATIVE_SCORE.
+        weaviate_document_collection_name (str, optional): The name of the collection with one vector per document.
+            When provided, the retriever first shortlists documents and only searches the chunks of those documents.
+        weaviate_num_documents (int, optional): The number of documents to shortlist. Defaults to 5.
+        embedder (Embedder, optional): Embeds the query on the client instead of with the vectorizer of the collection.
+            Required when the stored vectors are reduced, use the same ReducedEmbedder as during the import.
 
     Examples:
         Below is a code snippet that shows how to use Weaviate as the default retriver:
@@ -49,17 +54,28 @@ class WeaviateV4RM(dspy.Retrieve):
 
     def __init__(self,
                  weaviate_collection_name: str,
-                 weaviate_client: weaviate.WeaviateClient,
+                 weaviate_client: "weaviate.WeaviateClient",
                  k: int = 3,
                  weaviate_collection_text_key: Optional[str] = "content",
                  weaviate_alpha: Optional[float] = 0.5,
-                 weaviate_fusion_type: Optional[HybridFusion] = HybridFusion.RELATIVE_SCORE
+                 weaviate_fusion_type: Optional["HybridFusion"] = None,
+                 weaviate_document_collection_name: Optional[str] = None,
+                 weaviate_num_documents: int = 5,
+                 embedder: Optional[Embedder] = None,
         ):
+        if weaviate is None:
+            raise ImportError(
+                "The 'weaviate' extra is required to use WeaviateRM. Install it with `pip install dspy-ai[weaviate]`",
+            )
+
         self._weaviate_collection_name = weaviate_collection_name
         self._weaviate_client = weaviate_client
         self._weaviate_collection_text_key = weaviate_collection_text_key
         self._weaviate_alpha = weaviate_alpha
-        self._weaviate_fusion_type = weaviate_fusion_type
+        self._weaviate_fusion_type = weaviate_fusion_type if weaviate_fusion_type else HybridFusion.RELATIVE_SCORE
+        self._weaviate_document_collection_name = weaviate_document_collection_name
+        self._weaviate_num_documents = weaviate_num_documents
+        self._embedder = embedder
         super().__init__(k=k)
 
     def forward(self, query_or_queries: Union[str, List[str]], k: Optional[int] = None) -> dspy.Prediction:
@@ -81,11 +97,14 @@ class WeaviateV4RM(dspy.Retrieve):
         queries = [q for q in queries if q]
         passages = []
         for query in queries:
+            vector = self._embedder.embed(query) if self._embedder else None
             collection = self._weaviate_client.collections.get(self._weaviate_collection_name)
             results = collection.query.hybrid(query=query,
+                                              vector=vector,
                                               limit=k,
                                               alpha=self._weaviate_alpha,
                                               fusion_type=self._weaviate_fusion_type,
+                                              filters=self._document_filter(query, vector),
                                               return_metadata=wvc.query.MetadataQuery(
                                                   distance=True, score=True)
                                               )
@@ -95,3 +114,23 @@ class WeaviateV4RM(dspy.Retrieve):
 
         # Return type not changed, needs to be a Prediction object. But other code will break if we change it.
         return passages
+
+    def _document_filter(self, query: str, vector: Optional[List[float]]):
+        """Shortlists the documents closest to the query, the chunk search is limited to the chunks of those."""
+        if not self._weaviate_document_collection_name:
+            return None
+
+        documents = self._weaviate_client.collections.get(self._weaviate_document_collection_name)
+        if vector is not None:
+            results = documents.query.near_vector(near_vector=vector,
+                                                  limit=self._weaviate_num_documents,
+                                                  return_properties=["documentId"])
+        else:
+            results = documents.query.near_text(query=query,
+                                                limit=self._weaviate_num_documents,
+                                                return_properties=["documentId"])
+        document_ids = [result.properties["documentId"] for result in results.objects]
+        if not document_ids:
+            return None
+
+        return wvc.query.Filter.by_property("documentId").contains_any(document_ids)
@@ -23,4 +23,25 @@ def wordpress_collection_properties():
                      data_type=wvc.DataType.TEXT_ARRAY,
                      vectorize_property_name=False,
                      skip_vectorization=True),
-    ]
\ No newline at end of file
+    ]
+
+
+def wordpress_document_collection_properties():
+    return [
+        wvc.Property(name="documentId",
+                     data_type=wvc.DataType.TEXT,
+                     vectorize_property_name=False,
+                     skip_vectorization=True),
+        wvc.Property(name="totalChunks",
+                     data_type=wvc.DataType.INT,
+                     vectorize_property_name=False,
+                     skip_vectorization=True),
+        wvc.Property(name="title",
+                     data_type=wvc.DataType.TEXT,
+                     vectorize_property_name=False,
+                     skip_vectorization=True),
+        wvc.Property(name="url",
+                     data_type=wvc.DataType.TEXT,
+                     vectorize_property_name=False,
+                     skip_vectorization=True),
+    ]
@@ -0,0 +1,22 @@
+import dspy
+
+
+class GenerateAnswer(dspy.Signature):
+    """Answer questions with short answers using just a few sentences."""
+    context = dspy.InputField(desc="May contain relevant facts")
+    question = dspy.InputField()
+    answer = dspy.OutputField(desc="Short answer of one or a few sentences.")
+
+
+class RAG(dspy.Module):
+    """Retrieve, Answer, Generate module."""
+
+    def __init__(self, num_passages=3):
+        super().__init__()
+        self.retrieve = dspy.Retrieve(k=num_passages)
+        self.generate_answer = dspy.ChainOfThought(GenerateAnswer)
+
+    def forward(self, question):
+        context = self.retrieve(question).passages
+        prediction = self.generate_answer(question=question, context=context)
+        return dspy.Prediction(answer=prediction.answer, context=context)
@@ -0,0 +1,43 @@
+import argparse
+import os
+from pathlib import Path
+
+from dotenv import load_dotenv
+from rag4p.indexing.indexing_service import IndexingService
+from rag4p.indexing.splitters.max_token_splitter import MaxTokenSplitter
+from rag4p.integrations.openai import DEFAULT_EMBEDDING_MODEL
+
+from dspy_wordpress.integrations.local.shared_local_index import DOCUMENT_VECTORS_MEAN, SharedIndexContentStore
+from dspy_wordpress.util.dimension_reduction import REDUCTION_PCA, create_transform
+from dspy_wordpress.util.embedder_factory import EMBEDDER_ONNX, create_embedder
+from dspy_wordpress.util.wordpress_jsonl_reader import WordpressJsonlReader
+
+if __name__ == '__main__':
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Build the local index that is shared by the retrieval workers.")
+    parser.add_argument("--documents", default="all_documents.jsonl", help="File in the data folder to index")
+    parser.add_argument("--index-dir", default="../data/local_index", help="Directory to write the index to")
+    parser.add_argument("--embedder", default=EMBEDDER_ONNX, help="Embedder to use: onnx or openai")
+    parser.add_argument("--document-vectors", default=DOCUMENT_VECTORS_MEAN,
+                        help="Summary vector per document: mean of the chunks or title of the post")
+    parser.add_argument("--dimension", type=int, default=0,
+                        help="Reduce the embeddings to this number of dimensions, 0 keeps the full width")
+    parser.add_argument("--reduction", default=REDUCTION_PCA,
+                        help="How to reduce the embeddings: truncate (Matryoshka models) or pca (fitted on the corpus)")
+    args = parser.parse_args()
+
+    transform = create_transform(args.reduction, args.dimension) if args.dimension > 0 else None
+    content_store = SharedIndexContentStore(directory=args.index_dir,
+                                            embedder=create_embedder(args.embedder),
+                                            embedder_name=args.embedder,
+                                            document_vectors=args.document_vectors,
+                                            transform=transform)
+    indexing_service = IndexingService(content_store=content_store)
+    splitter = MaxTokenSplitter(max_tokens=200, model=DEFAULT_EMBEDDING_MODEL)
+    directory = os.getcwd()
+    file_path = Path(os.path.join(directory, "../data", args.documents))
+    content_reader = WordpressJsonlReader(file=file_path)
+
+    indexing_service.index_documents(content_reader=content_reader, splitter=splitter)
+    content_store.save()
@@ -0,0 +1,122 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from dotenv import load_dotenv
+
+from dspy_wordpress.integrations.local.shared_local_index import CHUNKS_FILE, EMBEDDINGS_FILE, INDEX_FILE, \
+    SQUARED_NORMS_FILE, SharedLocalIndex, read_index_metadata
+from dspy_wordpress.util.batch_embedding import embed_batch
+from dspy_wordpress.util.dimension_reduction import REDUCTION_PCA, REDUCTION_TRUNCATE, PcaTransform, \
+    create_transform
+from dspy_wordpress.util.embedder_factory import create_embedder
+
+
+def read_queries(file_path: Path, max_queries: int) -> list[str]:
+    with open(file_path, 'r') as file:
+        return [json.loads(line)["title"] for line in file][:max_queries]
+
+
+def write_reduced_index(source: Path, target: Path, embeddings: np.ndarray):
+    target.mkdir(parents=True, exist_ok=True)
+    np.save(target / EMBEDDINGS_FILE, embeddings)
+    np.save(target / SQUARED_NORMS_FILE, np.einsum('ij,ij->i', embeddings, embeddings))
+    shutil.copy(source / CHUNKS_FILE, target / CHUNKS_FILE)
+    shutil.copy(source / INDEX_FILE, target / INDEX_FILE)
+
+
+def top_k_by_dot_product(embeddings: np.ndarray, query_embeddings: np.ndarray, k: int) -> list[set[int]]:
+    """The rows with the largest dot product, the ranking of Rockset (APPROX_DOT_PRODUCT) and Weaviate (cosine)."""
+    scores = np.asarray(query_embeddings, dtype=np.float32) @ np.asarray(embeddings, dtype=np.float32).T
+    return [set(row) for row in np.argpartition(-scores, k - 1, axis=1)[:, :k].tolist()]
+
+
+def measure(index: SharedLocalIndex, query_embeddings: np.ndarray, expected: list[set[str]],
+            expected_dot_product: list[set[int]], k: int) -> dict:
+    latencies = []
+    found = 0
+    for query_embedding, expected_ids in zip(query_embeddings, expected):
+        start = time.perf_counter()
+        chunks = index.search(query_embedding[np.newaxis, :], k)[0]
+        latencies.append(time.perf_counter() - start)
+        found += len({chunk.get_id() for chunk in chunks} & expected_ids)
+
+    found_dot_product = sum(len(rows & expected_rows) for rows, expected_rows in
+                            zip(top_k_by_dot_product(index.embeddings, query_embeddings, k), expected_dot_product))
+
+    latencies.sort()
+    return {
+        "size_kb": (index.directory / EMBEDDINGS_FILE).stat().st_size / 1024,
+        "mean_ms": float(np.mean(latencies)) * 1000,
+        "p95_ms": latencies[int(0.95 * (len(latencies) - 1))] * 1000,
+        "recall": found / (k * len(expected)),
+        "recall_dot_product": found_dot_product / (k * len(expected)),
+    }
+
+
+if __name__ == '__main__':
+    """
+    Compares the full width index with truncated and PCA reduced versions of the same embeddings. Reports the size of
+    the embeddings file, the latency of one query and the recall@k against the full width results, ranked by euclidean
+    distance like the local index and by dot product like Rockset and Weaviate. Build a full width index first with
+    run_build_local_index.py, use --embedder openai for the 1536 dimensions of text-embedding-3-small.
+    """
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Benchmark of index size, latency and recall per dimension.")
+    parser.add_argument("--index-dir", default="../data/local_index", help="Directory with a full width local index")
+    parser.add_argument("--dimensions", default="1536,768,256", help="Comma separated dimensions to test")
+    parser.add_argument("--k", type=int, default=10, help="Number of chunks to compare for the recall")
+    parser.add_argument("--max-queries", type=int, default=100, help="Number of post titles to use as query")
+    parser.add_argument("--transform-dir", default=None,
+                        help="Save the fitted PCA transforms in this directory, to use them with Rockset or Weaviate")
+    args = parser.parse_args()
+
+    index_directory = Path(args.index_dir)
+    metadata = read_index_metadata(index_directory)
+    if metadata.get("full_dimension", metadata["dimension"]) != metadata["dimension"]:
+        raise ValueError(f"The index in {index_directory} is already reduced, use a full width index.")
+
+    embedder = create_embedder(metadata["embedder"])
+    full_index = SharedLocalIndex(directory=index_directory, embedder=embedder)
+    queries = read_queries(Path(os.path.join(os.getcwd(), "../data", "all_documents.jsonl")), args.max_queries)
+    query_embeddings = embed_batch(embedder, queries)
+    expected = [{chunk.get_id() for chunk in chunks} for chunks in full_index.search(query_embeddings, args.k)]
+    expected_dot_product = top_k_by_dot_product(full_index.embeddings, query_embeddings, args.k)
+
+    full_dimension = metadata["dimension"]
+    dimensions = [int(value) for value in args.dimensions.split(",")]
+    skipped = [dimension for dimension in dimensions if dimension > full_dimension]
+    if skipped:
+        print(f"Skipping dimensions {skipped}, the embedder {metadata['embedder']} has {full_dimension} dimensions.")
+
+    print(f"{'reduction':>10} {'dimension':>10} {'size kb':>9} {'mean ms':>8} {'p95 ms':>8} "
+          f"{'recall@' + str(args.k):>10} {'dot@' + str(args.k):>10}")
+    with tempfile.TemporaryDirectory() as temp_directory:
+        for dimension in [dimension for dimension in dimensions if dimension <= full_dimension]:
+            if dimension == full_dimension:
+                runs = [("none", full_index, query_embeddings)]
+            else:
+                runs = []
+                for reduction in (REDUCTION_TRUNCATE, REDUCTION_PCA):
+                    transform = create_transform(reduction, dimension)
+                    if isinstance(transform, PcaTransform):
+                        transform.fit(full_index.embeddings)
+                        if args.transform_dir:
+                            Path(args.transform_dir).mkdir(parents=True, exist_ok=True)
+                            transform.save(Path(args.transform_dir) / f"pca_{dimension}.npz")
+
+                    reduced_directory = Path(temp_directory) / f"{reduction}_{dimension}"
+                    write_reduced_index(index_directory, reduced_directory, transform.apply(full_index.embeddings))
+                    runs.append((reduction, SharedLocalIndex(directory=reduced_directory, embedder=embedder),
+                                 transform.apply(query_embeddings)))
+
+            for reduction, index, reduced_queries in runs:
+                result = measure(index, reduced_queries, expected, expected_dot_product, args.k)
+                print(f"{reduction:>10} {dimension:>10} {result['size_kb']:>9.1f} {result['mean_ms']:>8.3f} "
+                      f"{result['p95_ms']:>8.3f} {result['recall']:>10.3f} {result['recall_dot_product']:>10.3f}")
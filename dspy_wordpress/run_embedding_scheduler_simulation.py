@@ -0,0 +1,99 @@
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+from dspy_wordpress.embedding import logger_embedding
+from dspy_wordpress.embedding.fake_embedder import FakeRateLimitedEmbedder
+from dspy_wordpress.embedding.scheduler import PRIORITY_BULK, PRIORITY_INTERACTIVE, EmbeddingScheduler
+
+
+def read_documents(file_path: Path) -> list[dict]:
+    with open(file_path, 'r') as file:
+        return [json.loads(line) for line in file]
+
+
+def split_in_chunks(text: str, chunk_size: int) -> list[str]:
+    """Splits on characters, the simulation only needs texts of a realistic size."""
+    return [text[start:start + chunk_size] for start in range(0, len(text), chunk_size)]
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_queries(scheduler: EmbeddingScheduler, queries: list[str], interval: float, stop: threading.Event,
+                latencies: list[float], errors: list[Exception]):
+    number = 0
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            scheduler.embed(queries[number % len(queries)], PRIORITY_INTERACTIVE)
+            latencies.append(time.perf_counter() - start)
+        except Exception as e:
+            errors.append(e)
+        number += 1
+        stop.wait(interval)
+
+
+if __name__ == '__main__':
+    """
+    Re-indexes all posts through the EmbeddingScheduler while queries arrive at a fixed interval. The embedder is a
+    fake that answers with 429 when its limits are exceeded. Give the scheduler higher limits than the fake to see the
+    retries, or equal limits to see the token buckets prevent them. Reports the latency of the queries, the sizes of
+    the batches and the throughput and spend of the scheduler.
+    """
+    parser = argparse.ArgumentParser(description="Simulation of bulk ingest and queries through the scheduler.")
+    parser.add_argument("--provider-rpm", type=int, default=60, help="Requests per minute the fake embedder allows")
+    parser.add_argument("--provider-tpm", type=int, default=100_000, help="Tokens per minute the fake embedder allows")
+    parser.add_argument("--scheduler-rpm", type=int, default=120, help="Requests per minute the scheduler assumes")
+    parser.add_argument("--scheduler-tpm", type=int, default=200_000, help="Tokens per minute the scheduler assumes")
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Number of characters per chunk")
+    parser.add_argument("--query-interval", type=float, default=0.5, help="Seconds between two queries")
+    parser.add_argument("--backoff", type=float, default=1.0, help="Initial backoff after a 429 in seconds")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    logger_embedding.setLevel(logging.INFO)
+
+    documents = read_documents(Path(os.path.join(os.getcwd(), "../data", "all_documents.jsonl")))
+    chunks = [chunk for document in documents for chunk in split_in_chunks(document["body"], args.chunk_size)]
+    queries = [document["title"] for document in documents]
+
+    embedder = FakeRateLimitedEmbedder(requests_per_minute=args.provider_rpm, tokens_per_minute=args.provider_tpm)
+    scheduler = EmbeddingScheduler(embedder=embedder,
+                                   requests_per_minute=args.scheduler_rpm,
+                                   tokens_per_minute=args.scheduler_tpm,
+                                   max_batch_size=args.max_batch_size,
+                                   initial_backoff=args.backoff)
+
+    latencies = []
+    errors = []
+    stop = threading.Event()
+    query_thread = threading.Thread(target=run_queries,
+                                    args=(scheduler, queries, args.query_interval, stop, latencies, errors))
+    query_thread.start()
+
+    start = time.perf_counter()
+    try:
+        embeddings = scheduler.embed_many(chunks, PRIORITY_BULK)
+    finally:
+        stop.set()
+        query_thread.join()
+        scheduler.close()
+    ingest_seconds = time.perf_counter() - start
+
+    latencies.sort()
+    batch_sizes = embedder.batch_sizes
+    print(f"Ingested {len(embeddings)} chunks in {ingest_seconds:.1f} seconds")
+    print(f"Queries: {len(latencies)}, failed {len(errors)}, p50 {percentile(latencies, 0.50) * 1000:.1f} ms, "
+          f"p95 {percentile(latencies, 0.95) * 1000:.1f} ms, max {latencies[-1] * 1000:.1f} ms")
+    print(f"Provider calls: {len(batch_sizes)}, rejected with 429: {embedder.rejected}, "
+          f"mean batch size {sum(batch_sizes) / max(1, len(batch_sizes)):.1f}, max batch size {max(batch_sizes)}")
+    stats = scheduler.report()
+    print(f"Tokens/sec {stats['tokens_per_second']:.0f}, spend ${stats['spend']:.4f}, retries {stats['retries']}")
@@ -0,0 +1,75 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from dspy_wordpress.integrations.registry import available_backends
+
+SDK_MODULES = ["weaviate", "rockset", "openai", "onnxruntime"]
+
+
+def parse_importtime(stderr: str) -> list[tuple[str, int, int, bool]]:
+    """
+    Parses the lines "import time: self [us] | cumulative | imported package" of python -X importtime. Nested imports
+    are indented, the last element tells if the import was done directly by the measured statement.
+    """
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        top_level = len(name) - len(name.lstrip()) == 1
+        modules.append((name.strip(), int(self_us), int(cumulative_us), top_level))
+    return modules
+
+
+def measure_backend(statement: str) -> tuple[float, list[tuple[str, int, int, bool]]]:
+    environment = dict(os.environ)
+    environment["PYTHONPATH"] = os.pathsep.join(filter(None, [str(Path(__file__).parent.parent),
+                                                              environment.get("PYTHONPATH")]))
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                            capture_output=True, text=True, env=environment)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"Running {statement} failed:\n{result.stderr[-2000:]}")
+    return elapsed, parse_importtime(result.stderr)
+
+
+if __name__ == '__main__':
+    """
+    Measures the startup cost of every retriever backend in a fresh interpreter. The imports are timed with
+    python -X importtime, the report shows the wall time, the total import time, the number of imported modules and
+    which of the heavy SDKs were loaded.
+    """
+    parser = argparse.ArgumentParser(description="Import time benchmark per retriever backend.")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of fresh interpreters per backend")
+    parser.add_argument("--top", type=int, default=5, help="Number of slowest top level imports to show")
+    args = parser.parse_args()
+
+    statements = {"registry": "import dspy_wordpress.integrations.registry"}
+    for backend in available_backends():
+        statements[backend] = (f"from dspy_wordpress.integrations.registry import load_backend; "
+                               f"load_backend({backend!r})")
+
+    print(f"{'backend':>10} {'wall s':>8} {'imports s':>10} {'modules':>8}  sdks")
+    slowest = {}
+    for name, statement in statements.items():
+        runs = [measure_backend(statement) for _ in range(args.repeat)]
+        wall = statistics.median(elapsed for elapsed, _ in runs)
+        modules = runs[-1][1]
+        import_seconds = statistics.median(sum(module[1] for module in run[1]) for run in runs) / 1e6
+        loaded = {module[0].split(".")[0] for module in modules}
+        sdks = ",".join(sdk for sdk in SDK_MODULES if sdk in loaded) or "-"
+        print(f"{name:>10} {wall:>8.2f} {import_seconds:>10.2f} {len(modules):>8}  {sdks}")
+
+        top_level = [module for module in modules if module[3]]
+        slowest[name] = sorted(top_level, key=lambda module: module[2], reverse=True)[:args.top]
+
+    for name, modules in slowest.items():
+        print(f"\nSlowest imports for {name}:")
+        for module_name, _, cumulative_us, _ in modules:
+            print(f"  {module_name:<40} {cumulative_us / 1e6:>6.2f} s")
@@ -0,0 +1,155 @@
+import argparse
+import http.client
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+
+def read_queries(file_path: Path) -> list[str]:
+    with open(file_path, 'r') as file:
+        return [json.loads(line)["title"] for line in file]
+
+
+def wait_until_ready(host: str, port: int, timeout: float = 300.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection(host, port, timeout=5)
+            connection.request("GET", "/ready")
+            if connection.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"Server on port {port} was not ready within {timeout} seconds")
+
+
+def run_client(host: str, port: int, queries: list[str], offset: int, k: int, deadline: float,
+               latencies: list[float], errors: list[int]):
+    connection = http.client.HTTPConnection(host, port, timeout=30)
+    number = offset
+    while time.monotonic() < deadline:
+        body = json.dumps({"query": queries[number % len(queries)], "k": k})
+        number += 1
+        start = time.perf_counter()
+        try:
+            connection.request("POST", "/retrieve", body=body, headers={"Content-Type": "application/json"})
+            response = connection.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+                continue
+        except (OSError, http.client.HTTPException):
+            errors.append(0)
+            connection.close()
+            connection = http.client.HTTPConnection(host, port, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - start)
+    connection.close()
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_clients(host: str, port: int, queries: list[str], num_clients: int, offset: int, k: int,
+                duration: float) -> tuple[list[float], list[int]]:
+    latencies = []
+    errors = []
+    deadline = time.monotonic() + duration
+    clients = [
+        threading.Thread(target=run_client,
+                         args=(host, port, queries, offset + number * 7, k, deadline, latencies, errors))
+        for number in range(num_clients)
+    ]
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    return latencies, errors
+
+
+def load_test(host: str, port: int, queries: list[str], concurrency: int, client_processes: int, duration: float,
+              k: int) -> dict:
+    """
+    Spreads the concurrent clients over multiple processes, a single Python process cannot generate enough load to
+    keep multiple server workers busy.
+    """
+    latencies = []
+    errors = []
+    clients_per_process = [concurrency // client_processes + (1 if number < concurrency % client_processes else 0)
+                           for number in range(client_processes)]
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=client_processes) as executor:
+        futures = [executor.submit(run_clients, host, port, queries, num_clients, number * 1000, k, duration)
+                   for number, num_clients in enumerate(clients_per_process) if num_clients > 0]
+        for future in futures:
+            process_latencies, process_errors = future.result()
+            latencies.extend(process_latencies)
+            errors.extend(process_errors)
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    if not latencies:
+        return {"requests": 0, "errors": len(errors)}
+
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "throughput": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000,
+    }
+
+
+if __name__ == '__main__':
+    """
+    Starts the retrieval server with a growing number of workers and reports the throughput and the tail latency of
+    the /retrieve endpoint for each number of workers. Build the index first with run_build_local_index.py.
+    """
+    parser = argparse.ArgumentParser(description="Load test for the retrieval server.")
+    parser.add_argument("--index-dir", default="../data/local_index", help="Directory with the local index")
+    parser.add_argument("--workers", default="1,2,4", help="Comma separated numbers of workers to test")
+    parser.add_argument("--concurrency", type=int, default=32, help="Number of concurrent clients")
+    parser.add_argument("--client-processes", type=int, default=4, help="Number of processes running the clients")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds to run each test")
+    parser.add_argument("--k", type=int, default=3, help="Number of passages per query")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    host = "127.0.0.1"
+    queries = read_queries(Path(os.path.join(os.getcwd(), "../data", "all_documents.jsonl")))
+    server_script = Path(__file__).parent / "run_retrieval_server.py"
+
+    print(f"{'workers':>8} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for num_workers in [int(value) for value in args.workers.split(",")]:
+        server = subprocess.Popen([sys.executable, str(server_script),
+                                   "--index-dir", args.index_dir,
+                                   "--port", str(args.port),
+                                   "--workers", str(num_workers),
+                                   "--max-batch-size", str(args.max_batch_size),
+                                   "--max-wait-ms", str(args.max_wait_ms)])
+        try:
+            wait_until_ready(host, args.port)
+            result = load_test(host, args.port, queries, args.concurrency, args.client_processes, args.duration,
+                               args.k)
+        finally:
+            server.terminate()
+            server.wait()
+
+        if result["requests"] == 0:
+            print(f"{num_workers:>8} {0:>9} {result['errors']:>7}")
+            continue
+        print(f"{num_workers:>8} {result['requests']:>9} {result['errors']:>7} {result['throughput']:>9.1f} "
+              f"{result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f}")
@@ -0,0 +1,48 @@
+import argparse
+import logging
+import sys
+
+from dotenv import load_dotenv
+
+from dspy_wordpress.serving import logger_serving
+from dspy_wordpress.serving.retrieval_server import serve
+
+if __name__ == '__main__':
+    """
+    Serves the RAG module and the raw retrieval of the local index over HTTP. Build the index first with
+    run_build_local_index.py.
+    """
+    load_dotenv()
+
+    logging.basicConfig(
+        level=logging.WARNING,
+        format='%(asctime)s %(name)s [%(levelname)s] %(message)s',
+        handlers=[
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+    logger_serving.setLevel(logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Multi-process retrieval server for the local index.")
+    parser.add_argument("--index-dir", default="../data/local_index", help="Directory with the local index")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=2, help="Number of worker processes")
+    parser.add_argument("--num-passages", type=int, default=3, help="Number of passages used by the RAG module")
+    parser.add_argument("--max-batch-size", type=int, default=32, help="Maximum number of queries in one batch")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0, help="Maximum time to wait for a batch to fill")
+    parser.add_argument("--num-documents", type=int, default=0,
+                        help="Shortlist this number of documents before scoring chunks, 0 scores all chunks")
+    parser.add_argument("--window-size", type=int, default=0,
+                        help="Extend every hit with this number of neighbouring chunks on both sides")
+    args = parser.parse_args()
+
+    serve(index_directory=args.index_dir,
+          host=args.host,
+          port=args.port,
+          num_workers=args.workers,
+          num_passages=args.num_passages,
+          max_batch_size=args.max_batch_size,
+          max_wait_ms=args.max_wait_ms,
+          num_documents=args.num_documents,
+          window_size=args.window_size)
@@ -9,11 +9,15 @@ from rag4p.integrations.openai import DEFAULT_EMBEDDING_MODEL
 from rag4p.integrations.openai.openai_embedder import OpenAIEmbedder
 from rag4p.integrations.weaviate import chunk_collection
 from rag4p.integrations.weaviate.access_weaviate import AccessWeaviate
-from rag4p.integrations.weaviate.weaviate_content_store import WeaviateContentStore
 from rag4p.util.key_loader import KeyLoader
 
-from dspy_wordpress import WEAVIATE_CLASSNAME
-from dspy_wordpress.integrations.weaviate.wordpress_collection import wordpress_collection_properties
+from dspy_wordpress import WEAVIATE_CLASSNAME, WEAVIATE_DOCUMENT_CLASSNAME
+from dspy_wordpress.embedding import logger_embedding
+from dspy_wordpress.embedding.scheduler import PRIORITY_BULK, EmbeddingScheduler
+from dspy_wordpress.integrations.weaviate.weaviate_document_content_store import WeaviateDocumentContentStore
+from dspy_wordpress.integrations.weaviate.wordpress_collection import wordpress_collection_properties, \
+    wordpress_document_collection_properties
+from dspy_wordpress.util.dimension_reduction import ReducedEmbedder, load_transform
 from dspy_wordpress.util.wordpress_jsonl_reader import WordpressJsonlReader
 
 if __name__ == '__main__':
@@ -35,10 +39,24 @@ if __name__ == '__main__':
                                             properties=chunk_collection.weaviate_properties(
                                                 additional_properties=wordpress_collection_properties()
                                             ))
+    access_weaviate.force_create_collection(collection_name=WEAVIATE_DOCUMENT_CLASSNAME,
+                                            properties=wordpress_document_collection_properties())
 
-    embedder = OpenAIEmbedder(api_key=key_loader.get_openai_api_key())
-    content_store = WeaviateContentStore(weaviate_access=access_weaviate, embedder=embedder,
-                                         collection_name=WEAVIATE_CLASSNAME)
+    logger_embedding.setLevel(logging.INFO)
+
+    # All calls to OpenAI go through the scheduler, use the rate limits of your OpenAI account
+    scheduler = EmbeddingScheduler(embedder=OpenAIEmbedder(api_key=key_loader.get_openai_api_key()),
+                                   requests_per_minute=3000,
+                                   tokens_per_minute=1_000_000)
+    embedder = scheduler.embedder(PRIORITY_BULK)
+    # Store reduced vectors by providing a transform, for example a PCA projection from run_dimension_benchmark.py.
+    # Use the same transform for the embedder of the WeaviateV4RM.
+    transform_file = None
+    if transform_file:
+        embedder = ReducedEmbedder(embedder=embedder, transform=load_transform(transform_file))
+    content_store = WeaviateDocumentContentStore(weaviate_access=access_weaviate, embedder=embedder,
+                                                 collection_name=WEAVIATE_CLASSNAME,
+                                                 document_collection_name=WEAVIATE_DOCUMENT_CLASSNAME)
     splitter = MaxTokenSplitter(max_tokens=200, model=DEFAULT_EMBEDDING_MODEL)
     indexing_service = IndexingService(content_store=content_store)
 
@@ -48,4 +66,5 @@ if __name__ == '__main__':
 
     indexing_service.index_documents(content_reader=content_reader, splitter=splitter)
 
+    scheduler.report()
     access_weaviate.close()
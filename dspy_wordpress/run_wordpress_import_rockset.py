@@ -10,28 +10,52 @@ from rag4p.integrations.openai.openai_embedder import OpenAIEmbedder
 from rag4p.util.key_loader import KeyLoader
 from rockset import Regions
 
+from dspy_wordpress.embedding import logger_embedding
+from dspy_wordpress.embedding.scheduler import PRIORITY_BULK, PRIORITY_INTERACTIVE, EmbeddingScheduler
 from dspy_wordpress.integrations.rockset import logger_rockset
 from dspy_wordpress.integrations.rockset.access_rockset import AccessRockset
 from dspy_wordpress.integrations.rockset.rockset_content_store import RocksetContentStore
-from dspy_wordpress.integrations.rockset.wordpress_collection import ingest_transformation_query
+from dspy_wordpress.integrations.rockset.wordpress_collection import DEFAULT_DIMENSION, \
+    create_ingest_transformation_query, create_ingest_document_transformation_query
+from dspy_wordpress.util.dimension_reduction import TruncateTransform, load_transform, reduce_embedder
 from dspy_wordpress.util.wordpress_jsonl_reader import WordpressJsonlReader
 
 
+def create_embedder(priority: int):
+    """
+    The embedder for the chunks and the queries, reduced with the transform. All calls to OpenAI go through the
+    scheduler, with the provided priority.
+    """
+    return reduce_embedder(scheduler.embedder(priority), transform)
+
+
 def initialise_rockset():
     rockset.create_workspace(name=workspace_name)
     rockset.create_collection(workspace=workspace_name,
                               name=collection_name,
-                              transformation_query=ingest_transformation_query)
+                              transformation_query=create_ingest_transformation_query(embedding_dimension))
     rockset.create_similarity_index(workspace=workspace_name,
                                     collection=collection_name,
                                     index_name=similarity_index_name,
-                                    embedding_field=embedding_field)
+                                    embedding_field=embedding_field,
+                                    dimension=embedding_dimension)
+
+    # The collection with one embedding per post, used by the hierarchical search
+    rockset.create_collection(workspace=workspace_name,
+                              name=document_collection_name,
+                              transformation_query=create_ingest_document_transformation_query(embedding_dimension))
+    rockset.create_similarity_index(workspace=workspace_name,
+                                    collection=document_collection_name,
+                                    index_name=document_similarity_index_name,
+                                    embedding_field=document_embedding_field,
+                                    dimension=embedding_dimension)
 
     # Insert the documents
     content_store = RocksetContentStore(rockset_access=rockset,
                                         collection_name=collection_name,
                                         workspace_name=workspace_name,
-                                        embedder=OpenAIEmbedder(api_key=openai_api_key))
+                                        embedder=create_embedder(PRIORITY_BULK),
+                                        document_collection_name=document_collection_name)
     indexing_service = IndexingService(content_store=content_store)
     splitter = MaxTokenSplitter(max_tokens=200, model=DEFAULT_EMBEDDING_MODEL)
     directory = os.getcwd()
@@ -56,6 +80,7 @@ if __name__ == '__main__':
         ]
     )
     logger_rockset.setLevel(logging.DEBUG)
+    logger_embedding.setLevel(logging.INFO)
 
     logging.info("Starting the WordPress import to Rockset...")
 
@@ -71,6 +96,28 @@ if __name__ == '__main__':
     query_lambda_name = "wordpress_search_small"
     similarity_index_name = "wordpress_embeddings_similarity_index_small"
     embedding_field = "chunk_embedding"
+    document_collection_name = "WordPressDocuments"
+    hierarchical_query_lambda_name = "wordpress_search_hierarchical"
+    document_similarity_index_name = "wordpress_document_embeddings_similarity_index"
+    document_embedding_field = "document_embedding"
+    embedding_dimension = DEFAULT_DIMENSION
+    transform_file = None
+
+    # Without a transform_file the embeddings are truncated to the embedding_dimension, text-embedding-3-small
+    # supports that. With a transform_file, the fitted PCA projection from run_dimension_benchmark.py, the dimension
+    # of the transform is used, the collections enforce the dimension of the stored embeddings.
+    if transform_file:
+        transform = load_transform(transform_file)
+        embedding_dimension = transform.dimension
+    elif embedding_dimension < DEFAULT_DIMENSION:
+        transform = TruncateTransform(embedding_dimension)
+    else:
+        transform = None
+
+    # Use the rate limits of your OpenAI account
+    scheduler = EmbeddingScheduler(embedder=OpenAIEmbedder(api_key=openai_api_key),
+                                   requests_per_minute=3000,
+                                   tokens_per_minute=1_000_000)
 
     # Initialise the collection
     rockset = AccessRockset(api_key=rockset_api_key, api_server_region=rocket_region)
@@ -83,12 +130,17 @@ if __name__ == '__main__':
     rockset.create_query_lambda(workspace=workspace_name,
                                 collection=collection_name,
                                 query_lambda_name=query_lambda_name)
+    rockset.create_hierarchical_query_lambda(workspace=workspace_name,
+                                             collection=collection_name,
+                                             document_collection=document_collection_name,
+                                             query_lambda_name=hierarchical_query_lambda_name)
 
     # search_query = "What technology is used to create our coffee assistant?"
     search_query = "What technology is used to implement observability"
-    embedder = OpenAIEmbedder(api_key=openai_api_key)
+    embedder = create_embedder(PRIORITY_INTERACTIVE)
     embedding = embedder.embed(search_query)
 
     results = rockset.query_lambda(workspace=workspace_name, query_lambda_name=query_lambda_name, embedding=embedding)
 
     print(results)
+    scheduler.report()
@@ -0,0 +1,3 @@
+import logging
+
+logger_serving = logging.getLogger('servinglogger')
@@ -0,0 +1,74 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List
+
+from rag4p.rag.model.chunk import Chunk
+
+from dspy_wordpress.integrations.local.shared_local_index import SharedLocalIndex
+from dspy_wordpress.serving import logger_serving
+
+
+class _PendingQuery:
+    def __init__(self, query: str, max_results: int):
+        self.query = query
+        self.max_results = max_results
+        self.future = Future()
+
+
+class MicroBatcher:
+    """
+    Collects the queries of concurrent requests and sends them to the index as one batch. A batch is closed when it
+    contains max_batch_size queries, or when max_wait_ms passed since the first query arrived. All queries in a batch
+    share one call to the embedder and one scoring call on the index.
+
+    The batcher has the same find_relevant_chunks method as the content stores, so it can be used by the LocalRM.
+    """
+
+    def __init__(self, index: SharedLocalIndex, max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        self.index = index
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.num_batches = 0
+        self.num_queries = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self.__run, name="micro-batcher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def find_relevant_chunks(self, query: str, max_results: int = 4) -> List[Chunk]:
+        pending = _PendingQuery(query=query, max_results=max_results)
+        self._queue.put(pending)
+        return pending.future.result()
+
+    def __run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self.__process(batch)
+
+    def __process(self, batch: List[_PendingQuery]):
+        try:
+            max_results = max(pending.max_results for pending in batch)
+            results = self.index.find_relevant_chunks_batch([pending.query for pending in batch], max_results)
+        except Exception as e:
+            logger_serving.error(f"Batch of {len(batch)} queries failed: {e}")
+            for pending in batch:
+                pending.future.set_exception(e)
+            return
+
+        self.num_batches += 1
+        self.num_queries += len(batch)
+        for pending, chunks in zip(batch, results):
+            pending.future.set_result(chunks[:pending.max_results])
@@ -0,0 +1,228 @@
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional, Union
+
+import dspy
+
+from dspy_wordpress.integrations.local.local_rm import LocalRM
+from dspy_wordpress.integrations.local.shared_local_index import HierarchicalLocalIndex, SharedLocalIndex, \
+    read_index_metadata
+from dspy_wordpress.rag_module import RAG
+from dspy_wordpress.serving import logger_serving
+from dspy_wordpress.serving.micro_batcher import MicroBatcher
+from dspy_wordpress.util.embedder_factory import create_embedder
+
+
+class RetrievalHTTPServer(ThreadingHTTPServer):
+    """
+    HTTP server that is created and bound in the parent process and shared by the forked workers. Every worker accepts
+    connections on the same listening socket, the kernel spreads the connections over the workers. The parent keeps
+    track of the number of workers that finished their warm-up in a shared counter.
+    """
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, server_address, num_workers: int, ready_workers):
+        super().__init__(server_address, RetrievalRequestHandler)
+        self.num_workers = num_workers
+        self.ready_workers = ready_workers
+        self.index: Optional[SharedLocalIndex] = None
+        self.batcher: Optional[MicroBatcher] = None
+        self.rag: Optional[RAG] = None
+
+    def is_ready(self) -> bool:
+        return self.ready_workers.value >= self.num_workers
+
+
+class RetrievalRequestHandler(BaseHTTPRequestHandler):
+    """
+    Endpoints:
+        GET  /health    The worker process is running.
+        GET  /ready     All workers finished their warm-up, returns 503 before that.
+        GET  /stats     Batching statistics of the worker that handles the request.
+        POST /warmup    Runs the warm-up again on the worker that handles the request.
+        POST /retrieve  {"query": "...", "k": 3} returns the top k passages.
+        POST /rag       {"question": "..."} returns the answer of the RAG module and the used context.
+    """
+    server: RetrievalHTTPServer
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        if self.path == "/health":
+            self.__send_json(HTTPStatus.OK, {"status": "ok", "pid": os.getpid()})
+        elif self.path == "/ready":
+            status = HTTPStatus.OK if self.server.is_ready() else HTTPStatus.SERVICE_UNAVAILABLE
+            self.__send_json(status, {"ready_workers": self.server.ready_workers.value,
+                                      "workers": self.server.num_workers})
+        elif self.path == "/stats":
+            self.__send_json(HTTPStatus.OK, {"pid": os.getpid(),
+                                             "batches": self.server.batcher.num_batches,
+                                             "queries": self.server.batcher.num_queries})
+        else:
+            self.__send_json(HTTPStatus.NOT_FOUND, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        try:
+            body = self.__read_json()
+        except ValueError as e:
+            self.__send_json(HTTPStatus.BAD_REQUEST, {"error": f"Invalid json: {e}"})
+            return
+
+        try:
+            if self.path == "/retrieve":
+                self.__retrieve(body)
+            elif self.path == "/rag":
+                self.__rag(body)
+            elif self.path == "/warmup":
+                start = time.perf_counter()
+                self.server.index.warm_up()
+                self.__send_json(HTTPStatus.OK, {"pid": os.getpid(), "seconds": time.perf_counter() - start})
+            else:
+                self.__send_json(HTTPStatus.NOT_FOUND, {"error": f"Unknown path {self.path}"})
+        except Exception as e:
+            logger_serving.error(f"Error when handling {self.path}: {e}")
+            self.__send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(e)})
+
+    def __retrieve(self, body: dict):
+        query = body.get("query")
+        if not query:
+            self.__send_json(HTTPStatus.BAD_REQUEST, {"error": "Missing query"})
+            return
+
+        k = body.get("k", 3)
+        if not isinstance(k, int) or isinstance(k, bool) or k <= 0:
+            self.__send_json(HTTPStatus.BAD_REQUEST, {"error": "The k has to be a positive integer"})
+            return
+
+        chunks = self.server.batcher.find_relevant_chunks(query, k)
+        passages = [{
+            "long_text": chunk.chunk_text,
+            "document_id": chunk.document_id,
+            "chunk_id": chunk.chunk_id,
+            "title": chunk.properties.get("title"),
+            "url": chunk.properties.get("url"),
+        } for chunk in chunks]
+        self.__send_json(HTTPStatus.OK, {"passages": passages})
+
+    def __rag(self, body: dict):
+        question = body.get("question")
+        if not question:
+            self.__send_json(HTTPStatus.BAD_REQUEST, {"error": "Missing question"})
+            return
+
+        if self.server.rag is None:
+            self.__send_json(HTTPStatus.SERVICE_UNAVAILABLE,
+                             {"error": "No language model configured, provide the OPENAI_API_KEY"})
+            return
+
+        response = self.server.rag(question=question)
+        self.__send_json(HTTPStatus.OK, {"answer": response.answer, "context": response.context})
+
+    def __read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length", 0))
+        if length == 0:
+            return {}
+        return json.loads(self.rfile.read(length))
+
+    def __send_json(self, status: HTTPStatus, body: dict):
+        content = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        logger_serving.debug(f"{self.address_string()} {format % args}")
+
+
+def _run_worker(server: RetrievalHTTPServer,
+                index_directory: Path,
+                num_passages: int,
+                max_batch_size: int,
+                max_wait_ms: float,
+                num_documents: int,
+                window_size: int):
+    # Everything that holds threads, sessions or connections is created after the fork, in the worker itself.
+    metadata = read_index_metadata(index_directory)
+    embedder = create_embedder(metadata["embedder"])
+    if num_documents > 0:
+        index = HierarchicalLocalIndex(directory=index_directory,
+                                       embedder=embedder,
+                                       num_documents=num_documents,
+                                       window_size=window_size)
+    else:
+        index = SharedLocalIndex(directory=index_directory, embedder=embedder)
+    batcher = MicroBatcher(index=index, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+    batcher.start()
+
+    openai_api_key = os.environ.get('OPENAI_API_KEY')
+    lm = dspy.OpenAI(model='gpt-3.5-turbo-1106', max_tokens=300, api_key=openai_api_key) if openai_api_key else None
+    dspy.settings.configure(lm=lm, rm=LocalRM(content_store=batcher, k=num_passages))
+
+    server.index = index
+    server.batcher = batcher
+    server.rag = RAG(num_passages=num_passages) if lm is not None else None
+
+    start = time.perf_counter()
+    index.warm_up()
+    logger_serving.info(f"Worker {os.getpid()} warmed up in {time.perf_counter() - start:.2f} seconds")
+    with server.ready_workers.get_lock():
+        server.ready_workers.value += 1
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+def serve(index_directory: Union[str, Path],
+          host: str = "127.0.0.1",
+          port: int = 8080,
+          num_workers: int = 2,
+          num_passages: int = 3,
+          max_batch_size: int = 32,
+          max_wait_ms: float = 5.0,
+          num_documents: int = 0,
+          window_size: int = 0):
+    """
+    Starts num_workers processes that serve the local index over HTTP. The workers memory-map the same index files,
+    concurrent queries within a worker are combined by the MicroBatcher. With num_documents larger than 0 the workers
+    use the HierarchicalLocalIndex, that only scores the chunks of the num_documents best matching documents.
+    """
+    # Stopping the parent with SIGTERM also stops the workers, they inherit this handler with the fork.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    context = multiprocessing.get_context("fork")
+    ready_workers = context.Value('i', 0)
+    server = RetrievalHTTPServer((host, port), num_workers=num_workers, ready_workers=ready_workers)
+    logger_serving.info(f"Listening on http://{host}:{server.server_address[1]} with {num_workers} workers")
+
+    workers = [
+        context.Process(target=_run_worker,
+                        args=(server, Path(index_directory), num_passages, max_batch_size, max_wait_ms, num_documents,
+                              window_size),
+                        name=f"retrieval-worker-{number}")
+        for number in range(num_workers)
+    ]
+    for worker in workers:
+        worker.start()
+
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+        server.server_close()
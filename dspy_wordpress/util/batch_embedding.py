@@ -0,0 +1,40 @@
+from typing import List, Optional, Tuple
+
+import numpy as np
+from rag4p.rag.embedding.embedder import Embedder
+
+
+def embed_batch(embedder: Embedder, texts: List[str]) -> np.ndarray:
+    """
+    Embeds multiple texts with as few calls to the embedder as possible. The Embedder interface from rag4p only embeds
+    one text at a time, the OpenAI api accepts a list of inputs in one request.
+
+    :param embedder: The embedder to use
+    :param texts: The texts to embed
+    :return: A float32 matrix with one row per text
+    """
+    return embed_batch_with_usage(embedder, texts)[0]
+
+
+def embed_batch_with_usage(embedder: Embedder, texts: List[str]) -> Tuple[np.ndarray, Optional[int]]:
+    """
+    Same as embed_batch, but also returns the number of tokens the provider billed for the request. Only the OpenAI
+    api reports the usage, for the other embedders the number of tokens is None.
+
+    :param embedder: The embedder to use
+    :param texts: The texts to embed
+    :return: A float32 matrix with one row per text and the billed number of tokens
+    """
+    if hasattr(embedder, "embed_batch"):
+        return np.asarray(embedder.embed_batch(texts), dtype=np.float32), None
+
+    if hasattr(embedder, "client") and hasattr(embedder, "embedding_model"):
+        response = embedder.client.embeddings.create(input=texts,
+                                                     model=embedder.embedding_model,
+                                                     encoding_format="float")
+        embeddings = sorted(response.data, key=lambda item: item.index)
+        usage = getattr(response, "usage", None)
+        tokens = getattr(usage, "total_tokens", None) if usage is not None else None
+        return np.asarray([item.embedding for item in embeddings], dtype=np.float32), tokens
+
+    return np.asarray([embedder.embed(text) for text in texts], dtype=np.float32), None
@@ -0,0 +1,29 @@
+from typing import List
+
+import numpy as np
+from rag4p.rag.embedding.local.onnx_embedder import OnnxEmbedder
+
+
+class BatchOnnxEmbedder(OnnxEmbedder):
+    """
+    OnnxEmbedder that embeds multiple texts with one run of the model. The tokenizer pads the texts to the longest text
+    of the batch, the mean pooling uses the attention mask so the padding does not change the embeddings. For a single
+    text the result is the same as embed of the OnnxEmbedder.
+    """
+
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        encodings = self.tokenizer.encode_batch(texts, add_special_tokens=True)
+        attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        token_embeddings = self.ort_sess.run(None, {
+            'input_ids': np.array([encoding.ids for encoding in encodings], dtype=np.int64),
+            'attention_mask': attention_mask,
+            'token_type_ids': np.array([encoding.type_ids for encoding in encodings], dtype=np.int64),
+        })[0]
+
+        # Mean pooling over the tokens that are not padding
+        mask = attention_mask[:, :, np.newaxis].astype(np.float32)
+        summed = np.sum(np.asarray(token_embeddings, dtype=np.float32) * mask, axis=1)
+        return summed / np.maximum(np.sum(mask, axis=1), 1.0)
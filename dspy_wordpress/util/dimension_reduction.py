@@ -0,0 +1,154 @@
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import List, Optional, Union
+
+import numpy as np
+from rag4p.rag.embedding.embedder import Embedder
+
+from dspy_wordpress.util.batch_embedding import embed_batch
+
+REDUCTION_TRUNCATE = "truncate"
+REDUCTION_PCA = "pca"
+
+
+class EmbeddingTransform(ABC):
+    """
+    Maps full width embeddings to a smaller number of dimensions. The same transform has to be used for the chunks in
+    the store and for the query, the ReducedEmbedder takes care of that.
+    """
+
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+
+    def check_input(self, input_dimension: int):
+        """Raises a ValueError when the transform cannot be applied to embeddings with input_dimension dimensions."""
+        if input_dimension < self.dimension:
+            raise ValueError(f"Cannot reduce embeddings of {input_dimension} dimensions to {self.dimension} "
+                             f"dimensions.")
+
+    @abstractmethod
+    def apply(self, embeddings: np.ndarray) -> np.ndarray:
+        pass
+
+    @abstractmethod
+    def save(self, path: Union[str, Path]):
+        pass
+
+
+class TruncateTransform(EmbeddingTransform):
+    """
+    Keeps the first dimensions of the embedding and normalises the result again. This only works well for models that
+    are trained for it (Matryoshka representation learning), like the OpenAI text-embedding-3 models.
+    """
+
+    def apply(self, embeddings: np.ndarray) -> np.ndarray:
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        self.check_input(embeddings.shape[-1])
+        truncated = embeddings[..., :self.dimension]
+        norms = np.linalg.norm(truncated, axis=-1, keepdims=True)
+        return truncated / np.maximum(norms, 1e-12)
+
+    def save(self, path: Union[str, Path]):
+        np.savez(path, kind=REDUCTION_TRUNCATE, dimension=self.dimension)
+
+
+class PcaTransform(EmbeddingTransform):
+    """
+    Projects the embeddings on the principal components of the corpus and normalises the result again, Rockset and
+    Weaviate rank by dot product and cosine. Works for every embedding model, but has to be fitted on the corpus before
+    the first chunk is stored. Save the fitted transform with the index, the queries need the exact same projection.
+    """
+
+    def __init__(self, dimension: int, mean: Optional[np.ndarray] = None, components: Optional[np.ndarray] = None):
+        super().__init__(dimension)
+        self.mean = mean
+        self.components = components
+
+    def is_fitted(self) -> bool:
+        return self.components is not None
+
+    def fit(self, embeddings: np.ndarray) -> "PcaTransform":
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if self.dimension > min(embeddings.shape):
+            raise ValueError(f"Cannot fit {self.dimension} components on {embeddings.shape[0]} embeddings of "
+                             f"{embeddings.shape[1]} dimensions.")
+
+        self.mean = embeddings.mean(axis=0)
+        _, _, right_singular_vectors = np.linalg.svd(embeddings - self.mean, full_matrices=False)
+        self.components = right_singular_vectors[:self.dimension].astype(np.float32)
+        return self
+
+    def check_input(self, input_dimension: int):
+        if not self.is_fitted():
+            raise ValueError("The PCA transform has to be fitted before it can be applied.")
+        if input_dimension != self.mean.shape[0]:
+            raise ValueError(f"The PCA transform was fitted on embeddings of {self.mean.shape[0]} dimensions, the "
+                             f"embedder gives {input_dimension} dimensions.")
+
+    def apply(self, embeddings: np.ndarray) -> np.ndarray:
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        self.check_input(embeddings.shape[-1])
+        projected = (embeddings - self.mean) @ self.components.T
+        norms = np.linalg.norm(projected, axis=-1, keepdims=True)
+        return projected / np.maximum(norms, 1e-12)
+
+    def save(self, path: Union[str, Path]):
+        np.savez(path, kind=REDUCTION_PCA, dimension=self.dimension, mean=self.mean, components=self.components)
+
+
+def create_transform(reduction: str, dimension: int) -> EmbeddingTransform:
+    if reduction == REDUCTION_TRUNCATE:
+        return TruncateTransform(dimension)
+    elif reduction == REDUCTION_PCA:
+        return PcaTransform(dimension)
+    else:
+        raise ValueError(f"Unknown reduction: {reduction}")
+
+
+def load_transform(path: Union[str, Path]) -> EmbeddingTransform:
+    with np.load(path) as data:
+        kind = str(data["kind"])
+        dimension = int(data["dimension"])
+        if kind == REDUCTION_TRUNCATE:
+            return TruncateTransform(dimension)
+        elif kind == REDUCTION_PCA:
+            return PcaTransform(dimension, mean=data["mean"], components=data["components"])
+        else:
+            raise ValueError(f"Unknown reduction in {path}: {kind}")
+
+
+class ReducedEmbedder(Embedder):
+    """
+    Embedder that applies a transform to the embeddings of another embedder. Give this embedder to the content stores
+    and to the retrievers, so the chunks and the queries end up in the same reduced space.
+
+    When the transform truncates and the wrapped embedder is an OpenAI text-embedding-3 model, the api is asked for the
+    shorter embedding directly.
+    """
+
+    def __init__(self, embedder: Embedder, transform: EmbeddingTransform):
+        self.embedder = embedder
+        self.transform = transform
+
+    def embed(self, text: str) -> List[float]:
+        return self.embed_batch([text])[0].tolist()
+
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        if self.__supports_native_truncation():
+            response = self.embedder.client.embeddings.create(input=texts,
+                                                              model=self.embedder.embedding_model,
+                                                              dimensions=self.transform.dimension,
+                                                              encoding_format="float")
+            embeddings = [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+            return self.transform.apply(np.asarray(embeddings, dtype=np.float32))
+
+        return self.transform.apply(embed_batch(self.embedder, texts))
+
+    def __supports_native_truncation(self) -> bool:
+        return (isinstance(self.transform, TruncateTransform)
+                and hasattr(self.embedder, "client")
+                and str(getattr(self.embedder, "embedding_model", "")).startswith("text-embedding-3"))
+
+
+def reduce_embedder(embedder: Embedder, transform: Optional[EmbeddingTransform]) -> Embedder:
+    return ReducedEmbedder(embedder=embedder, transform=transform) if transform is not None else embedder
@@ -0,0 +1,23 @@
+import os
+
+from rag4p.rag.embedding.embedder import Embedder
+
+EMBEDDER_ONNX = "onnx"
+EMBEDDER_OPENAI = "openai"
+
+
+def create_embedder(name: str) -> Embedder:
+    """
+    Creates the embedder with the provided name. The imports are done inside the branches, so a worker that uses the
+    local onnx embedder does not load the OpenAI SDK and the other way around.
+    """
+    if name == EMBEDDER_ONNX:
+        from dspy_wordpress.util.batch_onnx_embedder import BatchOnnxEmbedder
+
+        return BatchOnnxEmbedder()
+    elif name == EMBEDDER_OPENAI:
+        from rag4p.integrations.openai.openai_embedder import OpenAIEmbedder
+
+        return OpenAIEmbedder(api_key=os.environ.get('OPENAI_API_KEY'))
+    else:
+        raise ValueError(f"Unknown embedder: {name}")
@@ -0,0 +1,55 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+from tokenizers import Tokenizer
+
+from dspy_wordpress.util.batch_embedding import embed_batch
+from dspy_wordpress.util.batch_onnx_embedder import BatchOnnxEmbedder
+
+TOKENIZER_FILE = Path(__file__).parent.parent / "data" / "tokenizer.json"
+DIMENSION = 16
+
+
+class CountingSession:
+    """Stands in for the onnx InferenceSession, every token id gets a fixed vector."""
+
+    def __init__(self):
+        self.runs = []
+
+    def run(self, output_names, feeds):
+        input_ids = feeds['input_ids']
+        self.runs.append(input_ids.shape)
+        vectors = np.sin(input_ids[:, :, np.newaxis] * (np.arange(DIMENSION) + 1) / 100.0)
+        return [vectors.astype(np.float32)]
+
+
+@pytest.fixture
+def embedder():
+    # The model file is not part of the repository, the tokenizer is the real one of the MiniLM model
+    embedder = BatchOnnxEmbedder.__new__(BatchOnnxEmbedder)
+    embedder.max_length = 512
+    embedder.tokenizer = Tokenizer.from_file(str(TOKENIZER_FILE))
+    embedder.tokenizer.enable_truncation(max_length=512)
+    embedder.tokenizer.enable_padding(pad_to_multiple_of=1)
+    embedder.ort_sess = CountingSession()
+    return embedder
+
+
+def test_batch_runs_the_model_once(embedder):
+    queries = [f"query number {number} " + "word " * number for number in range(16)]
+
+    embeddings = embed_batch(embedder, queries)
+
+    assert embeddings.shape == (16, DIMENSION)
+    assert len(embedder.ort_sess.runs) == 1
+    assert embedder.ort_sess.runs[0][0] == 16
+
+
+def test_padding_does_not_change_the_embeddings(embedder):
+    texts = ["short", "a much longer text with quite a few more tokens than the first one"]
+
+    batch = embedder.embed_batch(texts)
+    single = [embedder.embed(text) for text in texts]
+
+    np.testing.assert_allclose(batch, np.asarray(single), rtol=1e-5, atol=1e-6)
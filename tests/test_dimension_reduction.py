@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from dspy_wordpress.util.dimension_reduction import PcaTransform, ReducedEmbedder, TruncateTransform, \
+    load_transform
+
+
+@pytest.fixture
+def embeddings():
+    return np.random.default_rng(3).standard_normal((50, 24)).astype(np.float32)
+
+
+def test_pca_output_is_normalised(embeddings):
+    reduced = PcaTransform(8).fit(embeddings).apply(embeddings)
+
+    assert reduced.shape == (50, 8)
+    np.testing.assert_allclose(np.linalg.norm(reduced, axis=1), 1.0, rtol=1e-5)
+
+
+def test_unfitted_pca_is_rejected(embeddings):
+    with pytest.raises(ValueError, match="has to be fitted"):
+        PcaTransform(8).apply(embeddings)
+
+
+def test_pca_rejects_embeddings_of_another_width(embeddings):
+    transform = PcaTransform(8).fit(embeddings)
+
+    with pytest.raises(ValueError, match="fitted on embeddings of 24 dimensions"):
+        transform.apply(np.ones((2, 16), dtype=np.float32))
+
+
+def test_truncate_rejects_embeddings_smaller_than_the_dimension():
+    with pytest.raises(ValueError, match="Cannot reduce embeddings of 16 dimensions to 32"):
+        TruncateTransform(32).apply(np.ones((2, 16), dtype=np.float32))
+
+
+def test_saved_pca_transform_gives_the_same_projection(tmp_path, embeddings):
+    transform = PcaTransform(8).fit(embeddings)
+    transform.save(tmp_path / "pca.npz")
+
+    np.testing.assert_allclose(load_transform(tmp_path / "pca.npz").apply(embeddings), transform.apply(embeddings))
+
+
+class WidthEmbedder:
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+
+    def embed(self, text: str):
+        return np.ones(self.dimension).tolist()
+
+
+def test_reduced_embedder_reports_a_width_mismatch(embeddings):
+    embedder = ReducedEmbedder(embedder=WidthEmbedder(16), transform=PcaTransform(8).fit(embeddings))
+
+    with pytest.raises(ValueError, match="the embedder gives 16 dimensions"):
+        embedder.embed("text")
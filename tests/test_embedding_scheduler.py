@@ -0,0 +1,301 @@
+import threading
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from dspy_wordpress.embedding.fake_embedder import FakeRateLimitError, FakeRateLimitedEmbedder
+from dspy_wordpress.embedding.scheduler import PRIORITY_BULK, PRIORITY_INTERACTIVE, EmbeddingScheduler, TokenBucket
+
+
+class ScriptedEmbedder(FakeRateLimitedEmbedder):
+    """
+    Fake that records the texts of every call and answers the calls with the numbers in rate_limited_calls with a 429.
+    The call with the text "hold" waits for the gate, so a test can keep the bulk worker busy while it queues texts.
+    """
+
+    def __init__(self, rate_limited_calls=(), retry_after=None):
+        super().__init__(requests_per_minute=1_000_000, tokens_per_minute=1_000_000_000, dimension=8, latency=0.0,
+                         retry_after=retry_after)
+        self.rate_limited_calls = set(rate_limited_calls)
+        self.calls = []
+        self.gate = threading.Event()
+        self.gate.set()
+        self.entered = threading.Event()
+
+    def embed_batch(self, texts):
+        number = len(self.calls)
+        self.calls.append(list(texts))
+        if texts == ["hold"]:
+            self.entered.set()
+            self.gate.wait(5)
+        if number in self.rate_limited_calls:
+            self.rejected += 1
+            raise FakeRateLimitError("Rate limit reached", retry_after=self.retry_after)
+        return super().embed_batch(texts)
+
+
+def hold(scheduler: EmbeddingScheduler, embedder: ScriptedEmbedder) -> Future:
+    """Sends one bulk text and keeps the bulk worker waiting in the embedder until the gate is opened."""
+    embedder.gate.clear()
+    embedder.entered.clear()
+    future = scheduler.submit("hold", PRIORITY_BULK)
+    assert embedder.entered.wait(5)
+    return future
+
+
+@pytest.fixture
+def schedulers():
+    created = []
+    yield created
+    for scheduler in created:
+        scheduler.close()
+
+
+def create_scheduler(schedulers, embedder, **kwargs) -> EmbeddingScheduler:
+    scheduler = EmbeddingScheduler(embedder=embedder, requests_per_minute=1_000_000, tokens_per_minute=1_000_000_000,
+                                   **kwargs)
+    schedulers.append(scheduler)
+    return scheduler
+
+
+def test_rate_limited_batch_is_retried_before_the_rest_of_its_lane(schedulers):
+    embedder = ScriptedEmbedder(rate_limited_calls={1}, retry_after=0.01)
+    # The 429 empties the buckets, without a reserve the bulk lane does not wait for a tenth of them to refill
+    scheduler = create_scheduler(schedulers, embedder, max_batch_size=3, interactive_reserve=0.0)
+
+    hold(scheduler, embedder)
+    futures = [scheduler.submit(text, PRIORITY_BULK) for text in "abcdef"]
+    embedder.gate.set()
+
+    results = [future.result(timeout=5) for future in futures]
+    assert embedder.calls[1:] == [["a", "b", "c"], ["a", "b", "c"], ["d", "e", "f"]]
+    assert results == [embedder.embed(text) for text in "abcdef"]
+
+    stats = scheduler.stats()
+    assert stats["rate_limited"] == 1
+    assert stats["retries"] == 3
+    assert stats["failed"] == 0
+
+
+def test_exceeding_max_retries_fails_the_future(schedulers):
+    embedder = FakeRateLimitedEmbedder(dimension=8, latency=0.0, failure_rate=1.0)
+    scheduler = create_scheduler(schedulers, embedder, max_retries=2, initial_backoff=0.001)
+
+    with pytest.raises(FakeRateLimitError):
+        scheduler.embed("text")
+
+    assert embedder.rejected == 3
+    stats = scheduler.stats()
+    assert stats["rate_limited"] == 3
+    assert stats["retries"] == 2
+    assert stats["failed"] == 1
+    assert stats["texts"] == 0
+
+
+def test_interactive_text_goes_before_the_bulk_backlog(schedulers):
+    embedder = ScriptedEmbedder()
+    scheduler = create_scheduler(schedulers, embedder, max_batch_size=10)
+
+    hold(scheduler, embedder)
+    bulk = [scheduler.submit(f"bulk {number}", PRIORITY_BULK) for number in range(400)]
+    interactive = scheduler.submit("query", PRIORITY_INTERACTIVE)
+    embedder.gate.set()
+
+    interactive.result(timeout=5)
+    for future in bulk:
+        future.result(timeout=5)
+    assert embedder.calls[1] == ["query"]
+    assert embedder.calls[2] == [f"bulk {number}" for number in range(10)]
+
+
+def test_query_is_sent_while_a_slow_bulk_request_is_in_flight(schedulers):
+    embedder = ScriptedEmbedder()
+    scheduler = create_scheduler(schedulers, embedder)
+
+    bulk = hold(scheduler, embedder)
+    query = scheduler.submit("query", PRIORITY_INTERACTIVE)
+
+    assert query.result(timeout=5) == embedder.embed("query")
+    assert not bulk.done()
+    embedder.gate.set()
+    bulk.result(timeout=5)
+
+
+@pytest.mark.parametrize("max_batch_size, max_batch_tokens, expected_size", [
+    (4, 1_000, 4),
+    (4, 25, 2),
+    (4, 5, 1),
+])
+def test_batches_respect_max_batch_size_and_max_batch_tokens(schedulers, max_batch_size, max_batch_tokens,
+                                                             expected_size):
+    embedder = ScriptedEmbedder()
+    scheduler = create_scheduler(schedulers, embedder, max_batch_size=max_batch_size,
+                                 max_batch_tokens=max_batch_tokens, token_counter=lambda text: 10)
+
+    hold(scheduler, embedder)
+    texts = [f"text {number}" for number in range(8)]
+    futures = [scheduler.submit(text, PRIORITY_BULK) for text in texts]
+    embedder.gate.set()
+    for future in futures:
+        future.result(timeout=5)
+
+    assert [len(call) for call in embedder.calls[1:]] == [expected_size] * (len(texts) // expected_size)
+    assert [text for call in embedder.calls[1:] for text in call] == texts
+
+
+def test_token_bucket_waits_for_missing_units():
+    bucket = TokenBucket(rate_per_minute=60)
+    assert bucket.capacity == 60
+    assert bucket.wait_time(60) == 0.0
+
+    bucket.consume(60)
+    assert bucket.wait_time(30) == pytest.approx(30.0, abs=0.1)
+    assert bucket.wait_time(1000) == pytest.approx(60.0, abs=0.1)
+
+
+def test_token_bucket_keeps_the_reserve():
+    bucket = TokenBucket(rate_per_minute=60)
+    bucket.consume(40)
+
+    assert bucket.wait_time(10) == 0.0
+    assert bucket.wait_time(10, reserve=20) == pytest.approx(10.0, abs=0.1)
+    # A reserve larger than the bucket is limited to the capacity, otherwise it would wait forever
+    assert bucket.wait_time(10, reserve=1000) == pytest.approx(40.0, abs=0.1)
+
+
+def test_token_bucket_gives_back_up_to_the_capacity():
+    bucket = TokenBucket(rate_per_minute=60)
+    bucket.consume(60)
+    bucket.consume(-1000)
+
+    assert bucket.available == pytest.approx(60.0)
+
+
+def test_stats_count_the_estimated_tokens(schedulers):
+    embedder = FakeRateLimitedEmbedder(dimension=8, latency=0.0)
+    scheduler = create_scheduler(schedulers, embedder, token_counter=lambda text: 7,
+                                 price_per_million_tokens=2.0)
+
+    embeddings = scheduler.embed_many([f"text {number}" for number in range(5)])
+    scheduler.embed("query")
+
+    assert len(embeddings) == 5
+    stats = scheduler.stats()
+    assert stats["texts"] == 6
+    assert stats["tokens"] == 42
+    assert stats["requests"] == len(embedder.batch_sizes)
+    assert stats["spend"] == pytest.approx(42 / 1_000_000 * 2.0)
+    assert stats["rate_limited"] == 0
+    assert stats["retries"] == 0
+    assert stats["failed"] == 0
+    assert stats["pending_interactive"] == 0
+    assert stats["pending_bulk"] == 0
+
+
+class UsageEmbedder:
+    """Looks like the OpenAIEmbedder of rag4p, the response reports the billed tokens."""
+
+    embedding_model = "text-embedding-3-small"
+
+    def __init__(self, tokens_per_text: int):
+        self.tokens_per_text = tokens_per_text
+        self.client = SimpleNamespace(embeddings=SimpleNamespace(create=self.create))
+
+    def create(self, input, model, encoding_format):
+        data = [SimpleNamespace(index=index, embedding=np.ones(4).tolist()) for index in range(len(input))]
+        return SimpleNamespace(data=data, usage=SimpleNamespace(total_tokens=self.tokens_per_text * len(input)))
+
+    def embed(self, text):
+        raise AssertionError("The scheduler should embed in batches")
+
+
+def test_stats_count_the_billed_tokens(schedulers):
+    scheduler = create_scheduler(schedulers, UsageEmbedder(tokens_per_text=3), token_counter=lambda text: 100)
+
+    scheduler.embed_many(["a", "b", "c", "d"])
+
+    assert scheduler.stats()["tokens"] == 12
+
+
+class ServerError(Exception):
+    status_code = 503
+
+
+class FailingEmbedder(FakeRateLimitedEmbedder):
+    """Raises the given errors for the first calls, then embeds the texts."""
+
+    def __init__(self, errors):
+        super().__init__(dimension=8, latency=0.0)
+        self.errors = list(errors)
+        self.calls = 0
+
+    def embed_batch(self, texts):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return super().embed_batch(texts)
+
+
+def test_server_error_is_retried_without_counting_as_rate_limited(schedulers):
+    embedder = FailingEmbedder([ServerError("Service unavailable"), ConnectionError("Connection reset")])
+    scheduler = create_scheduler(schedulers, embedder, initial_backoff=0.001)
+
+    embedding = scheduler.embed("text")
+
+    assert embedder.calls == 3
+    assert embedding == embedder.embed("text")
+    stats = scheduler.stats()
+    assert stats["rate_limited"] == 0
+    assert stats["transient_errors"] == 2
+    assert stats["retries"] == 2
+    assert stats["failed"] == 0
+
+
+def test_other_errors_are_not_retried(schedulers):
+    embedder = FailingEmbedder([ValueError("Invalid input")])
+    scheduler = create_scheduler(schedulers, embedder, initial_backoff=0.001)
+
+    with pytest.raises(ValueError):
+        scheduler.embed("text")
+
+    assert embedder.calls == 1
+    stats = scheduler.stats()
+    assert stats["retries"] == 0
+    assert stats["failed"] == 1
+
+
+class OptionsClient:
+    """Looks like the OpenAI client, with_options gives a copy with other options."""
+
+    def __init__(self, max_retries=2):
+        self.max_retries = max_retries
+        self.copies = []
+        self.calls = 0
+        self.embeddings = SimpleNamespace(create=self.create)
+
+    def with_options(self, max_retries):
+        copy = OptionsClient(max_retries=max_retries)
+        self.copies.append(copy)
+        return copy
+
+    def create(self, input, model, encoding_format):
+        self.calls += 1
+        data = [SimpleNamespace(index=index, embedding=np.ones(4).tolist()) for index in range(len(input))]
+        return SimpleNamespace(data=data, usage=SimpleNamespace(total_tokens=len(input)))
+
+
+def test_scheduler_uses_a_client_without_retries(schedulers):
+    embedder = UsageEmbedder(tokens_per_text=1)
+    client = OptionsClient()
+    embedder.client = client
+    scheduler = create_scheduler(schedulers, embedder)
+
+    scheduler.embed("text")
+
+    assert len(client.copies) == 1
+    assert client.copies[0].max_retries == 0
+    assert client.copies[0].calls == 1
+    assert client.calls == 0
+    assert embedder.client is client
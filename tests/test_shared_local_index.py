@@ -0,0 +1,203 @@
+import threading
+
+import numpy as np
+import pytest
+from rag4p.rag.embedding.embedder import Embedder
+from rag4p.rag.model.chunk import Chunk
+
+from dspy_wordpress.integrations.local.shared_local_index import HierarchicalLocalIndex, SharedIndexContentStore, \
+    SharedLocalIndex
+from dspy_wordpress.serving.micro_batcher import MicroBatcher
+from dspy_wordpress.util.dimension_reduction import REDUCTION_PCA, REDUCTION_TRUNCATE, create_transform
+
+NUM_DOCUMENTS = 6
+CHUNKS_PER_DOCUMENT = 4
+DIMENSION = 32
+
+
+def chunk_text(document: int, chunk: int) -> str:
+    return f"document {document} chunk {chunk}"
+
+
+class ClusteredEmbedder(Embedder):
+    """The chunks of one document are close to the centre of that document, unknown texts get a random vector."""
+
+    def __init__(self, seed: int = 7):
+        random = np.random.default_rng(seed)
+        self.vectors = {}
+        for document in range(NUM_DOCUMENTS):
+            centre = random.standard_normal(DIMENSION)
+            for chunk in range(CHUNKS_PER_DOCUMENT):
+                self.vectors[chunk_text(document, chunk)] = centre + 0.2 * random.standard_normal(DIMENSION)
+        self.random = random
+
+    def embed(self, text: str) -> list[float]:
+        if text not in self.vectors:
+            self.vectors[text] = self.random.standard_normal(DIMENSION)
+        return self.vectors[text].tolist()
+
+
+def build_index(directory, embedder: Embedder, transform=None):
+    store = SharedIndexContentStore(directory=directory, embedder=embedder, embedder_name="test",
+                                    transform=transform)
+    for document in range(NUM_DOCUMENTS):
+        store.store([Chunk(document_id=str(document),
+                           chunk_id=chunk,
+                           total_chunks=CHUNKS_PER_DOCUMENT,
+                           chunk_text=chunk_text(document, chunk),
+                           properties={"title": f"Document {document}"})
+                     for chunk in range(CHUNKS_PER_DOCUMENT)])
+    store.save()
+
+
+@pytest.fixture
+def embedder():
+    return ClusteredEmbedder()
+
+
+@pytest.mark.parametrize("reduction", [None, REDUCTION_PCA, REDUCTION_TRUNCATE])
+def test_exact_match_is_ranked_first(tmp_path, embedder, reduction):
+    build_index(tmp_path, embedder, create_transform(reduction, 8) if reduction else None)
+    index = SharedLocalIndex(directory=tmp_path, embedder=embedder)
+
+    for document in range(NUM_DOCUMENTS):
+        for chunk in range(CHUNKS_PER_DOCUMENT):
+            chunks = index.find_relevant_chunks(chunk_text(document, chunk), max_results=3)
+            assert len(chunks) == 3
+            assert chunks[0].chunk_text == chunk_text(document, chunk)
+
+
+def test_batch_gives_the_same_results_as_single_queries(tmp_path, embedder):
+    build_index(tmp_path, embedder)
+    index = SharedLocalIndex(directory=tmp_path, embedder=embedder)
+    queries = [chunk_text(document, 1) for document in range(NUM_DOCUMENTS)]
+
+    batch = index.find_relevant_chunks_batch(queries, max_results=5)
+    for query, chunks in zip(queries, batch):
+        assert [chunk.get_id() for chunk in chunks] == \
+               [chunk.get_id() for chunk in index.find_relevant_chunks(query, max_results=5)]
+
+
+@pytest.mark.parametrize("max_results", [0, -1])
+def test_no_results_without_positive_max_results(tmp_path, embedder, max_results):
+    build_index(tmp_path, embedder)
+    index = SharedLocalIndex(directory=tmp_path, embedder=embedder)
+
+    assert index.find_relevant_chunks(chunk_text(0, 0), max_results=max_results) == []
+
+
+def test_max_results_is_limited_to_the_number_of_chunks(tmp_path, embedder):
+    build_index(tmp_path, embedder)
+    index = SharedLocalIndex(directory=tmp_path, embedder=embedder)
+
+    assert len(index.find_relevant_chunks(chunk_text(0, 0), max_results=100)) == NUM_DOCUMENTS * CHUNKS_PER_DOCUMENT
+
+
+def test_shortlist_only_returns_chunks_of_the_shortlisted_documents(tmp_path, embedder):
+    build_index(tmp_path, embedder)
+    index = HierarchicalLocalIndex(directory=tmp_path, embedder=embedder, num_documents=1)
+
+    for document in range(NUM_DOCUMENTS):
+        chunks = index.find_relevant_chunks(chunk_text(document, 2), max_results=10)
+        assert chunks[0].chunk_text == chunk_text(document, 2)
+        assert sorted(chunk.chunk_id for chunk in chunks) == list(range(CHUNKS_PER_DOCUMENT))
+        assert {chunk.document_id for chunk in chunks} == {str(document)}
+
+
+def test_shortlist_limits_the_number_of_documents(tmp_path, embedder):
+    build_index(tmp_path, embedder)
+    index = HierarchicalLocalIndex(directory=tmp_path, embedder=embedder, num_documents=2)
+
+    chunks = index.find_relevant_chunks(chunk_text(3, 0), max_results=NUM_DOCUMENTS * CHUNKS_PER_DOCUMENT)
+    assert len(chunks) == 2 * CHUNKS_PER_DOCUMENT
+    assert len({chunk.document_id for chunk in chunks}) == 2
+    assert chunks[0].chunk_text == chunk_text(3, 0)
+
+
+@pytest.mark.parametrize("chunk, expected", [
+    (0, [0, 1]),
+    (1, [0, 1, 2]),
+    (CHUNKS_PER_DOCUMENT - 1, [CHUNKS_PER_DOCUMENT - 2, CHUNKS_PER_DOCUMENT - 1]),
+])
+def test_window_stays_within_the_document(tmp_path, embedder, chunk, expected):
+    build_index(tmp_path, embedder)
+    index = HierarchicalLocalIndex(directory=tmp_path, embedder=embedder, num_documents=2, window_size=1)
+
+    for document in range(NUM_DOCUMENTS):
+        hit = index.find_relevant_chunks(chunk_text(document, chunk), max_results=1)[0]
+        assert hit.chunk_id == chunk
+        assert hit.chunk_text == " ".join(chunk_text(document, neighbour) for neighbour in expected)
+
+
+def test_overlapping_windows_become_one_passage(tmp_path, embedder):
+    build_index(tmp_path, embedder)
+    index = HierarchicalLocalIndex(directory=tmp_path, embedder=embedder, num_documents=1, window_size=1)
+
+    chunks = index.find_relevant_chunks(chunk_text(2, 1), max_results=CHUNKS_PER_DOCUMENT)
+    assert len(chunks) == 1
+    assert chunks[0].chunk_id == 1
+    assert chunks[0].chunk_text == " ".join(chunk_text(2, chunk) for chunk in range(CHUNKS_PER_DOCUMENT))
+
+
+@pytest.mark.parametrize("num_documents, window_size", [(0, 0), (-1, 0), (1, -1)])
+def test_invalid_shortlist_or_window_is_rejected(tmp_path, embedder, num_documents, window_size):
+    build_index(tmp_path, embedder)
+
+    with pytest.raises(ValueError):
+        HierarchicalLocalIndex(directory=tmp_path, embedder=embedder, num_documents=num_documents,
+                               window_size=window_size)
+
+
+class CountingIndex:
+    def __init__(self, index: SharedLocalIndex):
+        self.index = index
+        self.batch_sizes = []
+
+    def find_relevant_chunks_batch(self, queries, max_results):
+        self.batch_sizes.append(len(queries))
+        return self.index.find_relevant_chunks_batch(queries, max_results)
+
+
+def test_micro_batcher_combines_concurrent_queries(tmp_path, embedder):
+    build_index(tmp_path, embedder)
+    index = CountingIndex(SharedLocalIndex(directory=tmp_path, embedder=embedder))
+    batcher = MicroBatcher(index=index, max_batch_size=32, max_wait_ms=200)
+    batcher.start()
+
+    num_callers = 8
+    start = threading.Barrier(num_callers)
+    results = {}
+
+    def call(number: int):
+        start.wait()
+        results[number] = batcher.find_relevant_chunks(chunk_text(number % NUM_DOCUMENTS, 0), max_results=number + 1)
+
+    callers = [threading.Thread(target=call, args=(number,)) for number in range(num_callers)]
+    for caller in callers:
+        caller.start()
+    for caller in callers:
+        caller.join()
+
+    assert batcher.num_queries == num_callers
+    assert batcher.num_batches < num_callers
+    assert sum(index.batch_sizes) == num_callers
+    for number, chunks in results.items():
+        assert len(chunks) == number + 1
+        assert chunks[0].chunk_text == chunk_text(number % NUM_DOCUMENTS, 0)
+
+
+def test_micro_batcher_respects_max_batch_size(tmp_path, embedder):
+    build_index(tmp_path, embedder)
+    index = CountingIndex(SharedLocalIndex(directory=tmp_path, embedder=embedder))
+    batcher = MicroBatcher(index=index, max_batch_size=2, max_wait_ms=200)
+    batcher.start()
+
+    callers = [threading.Thread(target=batcher.find_relevant_chunks, args=(chunk_text(number, 0), 1))
+               for number in range(NUM_DOCUMENTS)]
+    for caller in callers:
+        caller.start()
+    for caller in callers:
+        caller.join()
+
+    assert max(index.batch_sizes) <= 2
+    assert sum(index.batch_sizes) == NUM_DOCUMENTS